@@ -1,5 +1,7 @@
 
-from typing import List
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
+from itertools import product
+from day05 import parallel_sweep
 
 
 def read_program(filename: str) -> List[int]:
@@ -8,20 +10,12 @@ def read_program(filename: str) -> List[int]:
     return [int(val) for val in raw_code.split(',')]
 
 
-def add_op(code: List[int], input1: int, input2: int, output: int) -> List[int]:
-    new_code = code.copy()
+def add_op(code: List[int], input1: int, input2: int, output: int) -> None:
+    code[output] = code[input1] + code[input2]
 
-    new_code[output] = code[input1] + code[input2]
 
-    return new_code
-
-
-def multiply_op(code: List[int], input1: int, input2: int, output: int) -> List[int]:
-    new_code = code.copy()
-
-    new_code[output] = code[input1] * code[input2]
-
-    return new_code
+def multiply_op(code: List[int], input1: int, input2: int, output: int) -> None:
+    code[output] = code[input1] * code[input2]
 
 
 instructions = {
@@ -31,12 +25,10 @@ instructions = {
 }
 
 
-def run_program(initial_memory: List[int], input1: int, input2: int) -> int:
-
-    memory = initial_memory.copy()
-
-    memory[1] = input1
-    memory[2] = input2
+def execute(memory: List[int]) -> None:
+    """
+    Run the program in memory until opcode 99, modifying memory in place.
+    """
 
     instruction_pointer = 0
     instruction = instructions[
@@ -44,20 +36,180 @@ def run_program(initial_memory: List[int], input1: int, input2: int) -> int:
     ]
 
     while instruction is not None:
-        parameter1_address = memory[instruction_pointer + 1]
-        parameter2_address = memory[instruction_pointer + 2]
-        output_address = memory[instruction_pointer + 3]
-
-        memory = instruction(memory, parameter1_address, parameter2_address, output_address)
+        instruction(
+            memory,
+            memory[instruction_pointer + 1],
+            memory[instruction_pointer + 2],
+            memory[instruction_pointer + 3]
+        )
 
         instruction_pointer += 4
         instruction = instructions[
             memory[instruction_pointer]
         ]
-    
+
+
+def run_program(initial_memory: List[int], input1: int, input2: int) -> List[int]:
+
+    memory = initial_memory.copy()
+
+    memory[1] = input1
+    memory[2] = input2
+
+    execute(memory)
+
     return memory
 
 
+def scratch_memory(initial_memory: List[int]) -> Tuple[List[int], List[int]]:
+    return initial_memory, initial_memory.copy()
+
+
+def run_in_scratch(scratch: Tuple[List[int], List[int]], inputs: Tuple[int, int]) -> int:
+    """
+    Run the program with the (input1, input2) pair in a scratch memory from scratch_memory, reset from the initial
+    memory first, and return the value left at address 0.
+    """
+
+    initial_memory, memory = scratch
+    memory[:] = initial_memory
+
+    memory[1], memory[2] = inputs
+
+    execute(memory)
+
+    return memory[0]
+
+
+def run_programs(initial_memory: List[int], inputs: Iterable[Tuple[int, int]]) -> Iterator[int]:
+    """
+    Run the program once for each (input1, input2) pair, yielding the value left at address 0 by each run. A single
+    scratch memory is reset from the initial memory for every run. The inputs patch the parameters of the first
+    instruction, so parameters are read from memory on every run rather than decoded once.
+    """
+
+    scratch = scratch_memory(initial_memory)
+
+    for input_pair in inputs:
+        yield run_in_scratch(scratch, input_pair)
+
+
+# A polynomial in the two inputs, mapping (power of input1, power of input2) to the coefficient
+Polynomial = Dict[Tuple[int, int], int]
+
+
+def polynomial_add(poly1: Polynomial, poly2: Polynomial) -> Polynomial:
+    result = dict(poly1)
+    for powers, coefficient in poly2.items():
+        result[powers] = result.get(powers, 0) + coefficient
+    return {powers: coefficient for powers, coefficient in result.items() if coefficient != 0}
+
+
+def polynomial_multiply(poly1: Polynomial, poly2: Polynomial) -> Polynomial:
+    result = {}
+    for (i1, j1), coefficient1 in poly1.items():
+        for (i2, j2), coefficient2 in poly2.items():
+            powers = (i1 + i2, j1 + j2)
+            result[powers] = result.get(powers, 0) + coefficient1 * coefficient2
+    return {powers: coefficient for powers, coefficient in result.items() if coefficient != 0}
+
+
+def polynomial_evaluate(poly: Polynomial, input1: int, input2: int) -> int:
+    return sum(coefficient * input1 ** i * input2 ** j for (i, j), coefficient in poly.items())
+
+
+def constant_value(poly: Optional[Polynomial]) -> Optional[int]:
+    if poly is None or any(powers != (0, 0) for powers in poly):
+        return None
+    return poly.get((0, 0), 0)
+
+
+def run_program_symbolically(initial_memory: List[int]) -> Optional[Polynomial]:
+    """
+    Run the program once with the inputs left as unknowns, returning the value left at address 0 as a polynomial
+    in the two inputs. A value read from an address that depends on the inputs is unknown, which is fine as long
+    as it is overwritten before it matters. Returns None when the result can't be found this way: the program
+    writes to or jumps on an address that depends on the inputs, or address 0 ends up unknown.
+    """
+
+    memory: List[Optional[Polynomial]] = [{(0, 0): value} if value != 0 else {} for value in initial_memory]
+    memory[1] = {(1, 0): 1}
+    memory[2] = {(0, 1): 1}
+
+    instruction_pointer = 0
+
+    while instruction_pointer < len(memory):
+        opcode = constant_value(memory[instruction_pointer])
+
+        if opcode == 99:
+            return memory[0]
+        elif opcode not in (1, 2) or instruction_pointer + 3 >= len(memory):
+            return None
+
+        input1_address, input2_address, output_address = [
+            constant_value(memory[instruction_pointer + i]) for i in range(1, 4)
+        ]
+
+        if output_address is None or not 0 <= output_address < len(memory):
+            return None
+
+        if input1_address is None or input2_address is None:
+            memory[output_address] = None
+        elif not (0 <= input1_address < len(memory) and 0 <= input2_address < len(memory)):
+            return None
+        elif memory[input1_address] is None or memory[input2_address] is None:
+            memory[output_address] = None
+        elif opcode == 1:
+            memory[output_address] = polynomial_add(memory[input1_address], memory[input2_address])
+        else:
+            memory[output_address] = polynomial_multiply(memory[input1_address], memory[input2_address])
+
+        instruction_pointer += 4
+
+    return None
+
+
+def find_inputs(
+    initial_memory: List[int], target: int, inputs1: Iterable[int]=range(0, 99), inputs2: Iterable[int]=range(0, 99)
+) -> Optional[Tuple[int, int]]:
+    """
+    Find the first (input1, input2) pair, in the order of a nested loop over inputs1 then inputs2, that leaves target
+    at address 0. Solves the polynomial from a symbolic run when there is one, otherwise runs the program for every
+    pair in parallel, each worker process in a scratch memory of its own.
+    """
+
+    inputs2 = list(inputs2)
+    poly = run_program_symbolically(initial_memory)
+
+    if poly is None:
+        results = parallel_sweep(
+            run_in_scratch, initial_memory, product(inputs1, inputs2), target=target, prepare=scratch_memory
+        )
+        if results and results[-1][1] == target:
+            return results[-1][0]
+        return None
+
+    for input1 in inputs1:
+        # Substitute input1 to get a polynomial in input2. When it's linear in input2 solve for it directly.
+        coefficients: Dict[int, int] = {}
+        for (i, j), coefficient in poly.items():
+            coefficients[j] = coefficients.get(j, 0) + coefficient * input1 ** i
+
+        if all(j <= 1 for j in coefficients):
+            offset, slope = coefficients.get(0, 0), coefficients.get(1, 0)
+            if slope == 0:
+                if offset == target and len(inputs2) > 0:
+                    return input1, inputs2[0]
+            elif (target - offset) % slope == 0 and (target - offset) // slope in inputs2:
+                return input1, (target - offset) // slope
+        else:
+            for input2 in inputs2:
+                if sum(coefficient * input2 ** j for j, coefficient in coefficients.items()) == target:
+                    return input1, input2
+
+    return None
+
+
 if __name__ == '__main__':
 
     test_program = [1,0,0,0,99]
@@ -76,6 +228,33 @@ if __name__ == '__main__':
     test_output = run_program(test_program, 1, 1)
     assert all(truth == test for truth, test in zip(test_output, [30,1,1,4,2,5,6,0,99]))
 
+    test_program = [1,9,10,3,2,3,11,0,99,30,40,50]
+    assert list(run_programs(test_program, [(9, 10), (0, 0), (9, 10)])) == [3500, 100, 3500]
+
+    # The symbolic run agrees with running the program, and gives up once an output address depends on the inputs
+    test_program = read_program('./inputs/day02.txt')
+    test_poly = run_program_symbolically(test_program)
+    assert polynomial_evaluate(test_poly, 12, 2) == run_program(test_program, 12, 2)[0]
+    assert polynomial_evaluate(test_poly, 93, 42) == run_program(test_program, 93, 42)[0]
+    assert find_inputs(test_program, 19690720) == (93, 42)
+    assert run_program_symbolically([1,0,0,3,1,1,2,0,99]) == {(1, 0): 1, (0, 1): 1}
+    test_program = [1,0,0,3,1,1,2,3,1,3,3,15,1,0,0,0,99]
+    assert run_program_symbolically(test_program) is None
+    assert find_inputs(test_program, 2, range(0, 4), range(0, 4)) == (0, 0)
+    assert find_inputs(test_program, 1, range(0, 4), range(0, 4)) == (0, 1)
+
+    test_program = read_program('./inputs/day02.txt')
+    test_inputs = [(noun, 42) for noun in range(90, 99)]
+    test_results = parallel_sweep(
+        run_in_scratch, test_program, test_inputs, prepare=scratch_memory, chunk_size=2, max_workers=2
+    )
+    assert test_results == [(inputs, run_program(test_program, *inputs)[0]) for inputs in test_inputs]
+    test_results = parallel_sweep(
+        run_in_scratch, test_program, test_inputs, target=19690720, prepare=scratch_memory, chunk_size=2,
+        max_workers=2
+    )
+    assert test_results[-1] == ((93, 42), 19690720)
+
     print('All Tests Passed!')
 
     program_memory = read_program('./inputs/day02.txt')
@@ -84,14 +263,5 @@ if __name__ == '__main__':
 
     print(f"First answer: {output1[0]}")
 
-    found_it = False
-    for noun in range(0, 99):
-        for verb in range(0, 99):
-            test_output = run_program(program_memory, noun, verb)
-
-            if test_output[0] == 19690720:
-                print(f'Found it! Second answer: 100 * {noun} + {verb} = {100 * noun + verb}')
-                found_it = True
-                break
-        if found_it:
-            break
+    noun, verb = find_inputs(program_memory, 19690720)
+    print(f'Found it! Second answer: 100 * {noun} + {verb} = {100 * noun + verb}')
@@ -1,45 +1,311 @@
 
-from typing import List, Tuple, Callable, Dict, Union
+from typing import List, Tuple, Callable, Dict, Set, Deque, Iterable, Iterator, NamedTuple, Optional, Union, BinaryIO, Any
+from copy import copy
+import asyncio
+import atexit
+import hashlib
+import marshal
+import os
+import sys
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from math import ceil
+from types import CodeType
+
+# Parsed programs and the blocks compiled for them can be kept in a directory between runs, see read_program and
+# CompiledIntcodeComputer. The cache is off unless INTCODE_CACHE names a directory. Files are named after a hash of
+# the program, so they never go stale.
+CACHE_DIRECTORY = os.environ.get('INTCODE_CACHE')
+
+
+def program_key(memory: List[int]) -> Optional[str]:
+    """
+    Hash of a program, for naming its cache files. None if the program has values too big to cache.
+    """
+    try:
+        return hashlib.sha256(array('q', memory).tobytes()).hexdigest()
+    except OverflowError:
+        return None
+
+
+def write_cache_file(path: str, write: Callable[[BinaryIO], None]) -> None:
+    """
+    Write a cache file through a temporary file, so other processes never read half of it. A cache that can't be
+    written is just not used.
+    """
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary_path, 'wb') as f:
+            write(f)
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
 
 
-def read_program(filename: str) -> List[int]:
-    with open(filename, 'r') as f:
+def read_program(filename: str, cache_directory: Optional[str]=CACHE_DIRECTORY) -> List[int]:
+    with open(filename, 'rb') as f:
         raw_code = f.read()
-    return [int(val) for val in raw_code.split(',')]
+
+    if cache_directory is None:
+        return [int(val) for val in raw_code.split(b',')]
+
+    # The parsed program is cached as an array of 64 bit words, named after a hash of the text
+    path = os.path.join(cache_directory, hashlib.sha256(raw_code).hexdigest() + '.program')
+    program = array('q')
+    try:
+        with open(path, 'rb') as f:
+            program.fromfile(f, os.fstat(f.fileno()).st_size // program.itemsize)
+        return program.tolist()
+    except OSError:
+        pass
+
+    program = [int(val) for val in raw_code.split(b',')]
+    try:
+        image = array('q', program)
+    except OverflowError:
+        return program
+    write_cache_file(path, image.tofile)
+    return program
 
 
 class Parameter(object):
+    __slots__ = ('value', 'mode')
+
     def __init__(self, value: int, mode: int) -> None:
         self.value = value
         self.mode = mode
+
     def get(self, memory: List[int], relative_base: int) -> int:
         if self.mode == 1:
             return self.value
         elif self.mode == 2:
             try:
-                value = memory[self.value + relative_base]
+                return memory[self.value + relative_base]
             except IndexError:
-                memory.extend([0 for _ in range(self.value + relative_base - len(memory) + 1)])
-                value = 0
-            return value
+                return 0
         else:
             try:
-                value = memory[self.value]
+                return memory[self.value]
             except IndexError:
-                memory.extend([0 for _ in range(self.value - len(memory) + 1)])
-                value = 0
-            return value
+                return 0
+
+    def address(self, relative_base: int) -> int:
+        if self.mode == 2:
+            return self.value + relative_base
+        return self.value
+
+
+class ListMemory(list):
+    """
+    Dense memory backed by a single list, grown with zeros up to the highest address written. Reading past the
+    end raises IndexError, which is read as 0.
+    """
+
+    def copy(self) -> 'ListMemory':
+        return ListMemory(self)
+
+    def fork(self) -> 'ListMemory':
+        # A list can't share its storage, so forking is a full copy
+        return ListMemory(self)
+
+    def expand(self, address: int) -> None:
+        self.extend([0] * (address - len(self) + 1))
+
+    def reset(self, pristine_memory: 'ListMemory', dirty_addresses: Set[int]) -> None:
+        del self[len(pristine_memory):]
+        for address in dirty_addresses:
+            if address < len(pristine_memory):
+                self[address] = pristine_memory[address]
+
+
+class PagedMemory(object):
+    """
+    Sparse memory split into fixed size pages that are allocated the first time they are written, so memory use
+    depends on the addresses a program touches rather than on the highest one. Untouched addresses read as 0.
+
+    Forking shares every page between the two memories, and a shared page is only copied when one of them
+    writes to it.
+    """
+
+    def __init__(self, initial_memory: List[int]=(), page_bits: int=8) -> None:
+        self.page_bits = page_bits
+        self.page_size = 1 << page_bits
+        self.page_mask = self.page_size - 1
+
+        self.pages: Dict[int, List[int]] = {}
+        self.shared_pages: Set[int] = set()
+        self.length = len(initial_memory)
+
+        for start in range(0, len(initial_memory), self.page_size):
+            values = list(initial_memory[start:start + self.page_size])
+            values.extend([0] * (self.page_size - len(values)))
+            self.pages[start >> page_bits] = self.new_page(values)
+
+    def new_page(self, values: List[int]) -> List[int]:
+        return values
+
+    def __getitem__(self, address: int) -> int:
+        page = self.pages.get(address >> self.page_bits)
+        if page is None:
+            return 0
+        return page[address & self.page_mask]
+
+    def __setitem__(self, address: int, value: int) -> None:
+        page_number = address >> self.page_bits
+        page = self.pages.get(page_number)
+        if page is None:
+            page = self.new_page([0] * self.page_size)
+            self.pages[page_number] = page
+        elif page_number in self.shared_pages:
+            page = page[:]
+            self.pages[page_number] = page
+            self.shared_pages.discard(page_number)
+        page[address & self.page_mask] = value
+
+        if address >= self.length:
+            self.length = address + 1
+
+    def __len__(self) -> int:
+        # One past the highest address written, like a list grown to hold every write
+        return self.length
+
+    def __iter__(self) -> Iterator[int]:
+        return (self[address] for address in range(self.length))
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(length={self.length}, pages={sorted(self.pages)})'
+
+    def fork(self) -> 'PagedMemory':
+        memory = type(self)(page_bits=self.page_bits)
+        memory.pages = self.pages.copy()
+        memory.length = self.length
+
+        self.shared_pages = set(self.pages)
+        memory.shared_pages = set(self.pages)
+
+        return memory
+
+    copy = fork
+
+    def reset(self, pristine_memory: 'PagedMemory', dirty_addresses: Set[int]) -> None:
+        # Point every dirty page back at the (shared) pristine page, or drop it if the program allocated it
+        for page_number in {address >> self.page_bits for address in dirty_addresses}:
+            pristine_page = pristine_memory.pages.get(page_number)
+            if pristine_page is None:
+                self.pages.pop(page_number, None)
+            else:
+                self.pages[page_number] = pristine_page
+                self.shared_pages.add(page_number)
+
+        self.length = pristine_memory.length
+
+
+class ArrayMemory(PagedMemory):
+    """
+    PagedMemory with each page a compact array of signed 64 bit words rather than a list of Python ints. A page
+    is promoted to a list the first time it has to hold a value outside 64 bits, so programs that need big
+    integers still get them, only on the pages holding them.
+    """
+
+    def new_page(self, values: List[int]) -> Union[array, List[int]]:
+        try:
+            return array('q', values)
+        except OverflowError:
+            return values
+
+    def __setitem__(self, address: int, value: int) -> None:
+        try:
+            super().__setitem__(address, value)
+        except OverflowError:
+            # The page is allocated and not shared by now, only the value didn't fit
+            page_number = address >> self.page_bits
+            self.pages[page_number] = list(self.pages[page_number])
+            super().__setitem__(address, value)
+
+
+class IntcodeState(NamedTuple):
+    memory: Union[ListMemory, PagedMemory]
+    instruction_pointer: int
+    relative_base: int
+
+
+OPCODE_NAMES = {
+    1: 'add',
+    2: 'multiply',
+    3: 'input',
+    4: 'output',
+    5: 'jump-if-true',
+    6: 'jump-if-false',
+    7: 'less-than',
+    8: 'equals',
+    9: 'relative-base-offset',
+    99: 'halt',
+}
+
+# Reasons IntcodeComputer.execute stops
+HALTED, NEEDS_INPUT, OUTPUT, BUDGET_EXHAUSTED = 0, 1, 2, 3
+
+# Instruction budget of an unbudgeted execute, more than any program gets through
+UNLIMITED = 2 ** 62
+
+
+class RunSlice(NamedTuple):
+    """
+    The result of running until the program halts, needs input or uses up its budget: the status (HALTED,
+    NEEDS_INPUT or BUDGET_EXHAUSTED), the outputs produced, and the inputs the program didn't get to. The computer
+    keeps its state, so passing those inputs to run_slice again carries on where it stopped.
+    """
+    status: int
+    outputs: List[int]
+    inputs: Deque[int]
+
+
+class BudgetExhausted(RuntimeError):
+    """
+    Raised by the run methods when a program runs through its instruction budget before returning control.
+    """
+
+    def __init__(self, run_slice: RunSlice) -> None:
+        super().__init__('Program ran out of instruction budget')
+        self.slice = run_slice
+
+# A decoded instruction is the op function, whether it takes input, gives output, its parameters, and the number of
+# Intcode instructions it runs (more than one for fused instructions)
+DecodedInstruction = Tuple[Callable, bool, bool, Tuple, int]
 
 
 class IntcodeComputer(object):
 
-    def __init__(self, initial_memory: List[int]) -> None:
+    def __init__(self, initial_memory: List[int], memory_backend: Callable=ListMemory) -> None:
+        # The memory backend is called with the initial memory, see ListMemory and PagedMemory. The pristine
+        # memory is never written, each run starts from a fork of it.
+        self.memory_backend = memory_backend
         self.initial_memory = initial_memory.copy()
-        self.memory = initial_memory.copy()
+        self.pristine_memory = memory_backend(initial_memory)
+        self.memory = self.pristine_memory.fork()
+
+        # Addresses written since the memory was forked from the pristine memory, so a reset only has to
+        # restore those. They're unknown after restoring a snapshot, and the next reset forks a new memory.
+        self.dirty_addresses: Set[int] = set()
+        self.dirty_addresses_known = True
 
         self.instruction_pointer = 0
         self.relative_base = 0
 
+        # The part of its budget the last budgeted execute didn't use
+        self.budget_left = 0
+
+        self.initialize_interpreter()
+
+    def initialize_interpreter(self) -> None:
+        """
+        Set up the instruction table and empty caches. Everything here belongs to a single computer, so forks
+        call this rather than sharing it.
+        """
+
         # Tuples are  
         #    the op function, whether it takes input, gives output, 
         #    and # of parameters to pass to the function
@@ -56,72 +322,159 @@ class IntcodeComputer(object):
             99: (None, False, False, 0),
         }
 
-    def parse_instruction(self) -> Tuple[Callable, bool, bool, List[Parameter]]:
-        
-        opcode_parammode = self.memory[self.instruction_pointer]
+        # Decoded instructions keyed on the address they start at, and for every address covered by a
+        # decoded instruction, the start address of the instruction that covers it. Writing to a covered
+        # address throws the decoded instructions away so self-modifying programs still run correctly.
+        self.decode_cache: Dict[int, DecodedInstruction] = {}
+        self.decoded_addresses: Dict[int, int] = {}
+
+        # Instructions that are never fused with others: ones that were jumped to in the middle of a decoded
+        # instruction (or the two would keep evicting each other), and ones the program overwrote (decoding
+        # them again keeps costing more than fusing them saves)
+        self.unfused_addresses: Set[int] = set()
+
+    def read_instruction(self, address: int) -> Tuple[DecodedInstruction, int]:
+        """
+        Decode the single instruction at `address` without caching it. Also returns its length in words.
+        """
 
-        op_string = str(opcode_parammode)
-        opcode = int(op_string[-2:])
+        opcode_parammode = self.memory[address]
+        opcode = opcode_parammode % 100
+        modes = opcode_parammode // 100
 
         (op_function, takes_input, sends_output, n_params) = self.instructions[opcode]
 
         params = []
-        index = -3
         for i in range(n_params):
-            try:
-                params.append(
-                    Parameter(
-                        self.memory[self.instruction_pointer + 1 + i],
-                        int(op_string[index])
-                    )
-                )
-                index -= 1
-            except IndexError:
-                params.append(
-                    Parameter(
-                        self.memory[self.instruction_pointer + 1 + i],
-                        0
-                    )
-                )
+            params.append(Parameter(self.memory[address + 1 + i], modes % 10))
+            modes //= 10
 
-        return op_function, takes_input, sends_output, params
+        return (op_function, takes_input, sends_output, tuple(params), 1), n_params + 1
 
-    def add_op(self, parameter1: Parameter, parameter2: Parameter, parameter3: Parameter) -> None:
-        if parameter3.mode == 2:
-            value = parameter3.value + self.relative_base
-        else: 
-            value = parameter3.value
+    def fuse_instructions(
+        self, address: int, decoded: DecodedInstruction, length: int
+    ) -> Tuple[DecodedInstruction, int]:
+        """
+        Peephole pass over a decoded instruction and the one following it, replacing common idioms with a single
+        superinstruction: a comparison followed by a conditional jump, a relative base offset followed by any
+        instruction without I/O, an in-place add of an immediate, and a jump that is always taken. Returns the
+        instruction unchanged if it isn't part of an idiom.
+        """
 
-        if value >= len(self.memory):
-            self.memory.extend([0 for _ in range(value - len(self.memory) + 1)])
+        opcode = self.memory[address] % 100
+        parameters = decoded[3]
+
+        if address in self.unfused_addresses:
+            return decoded, length
+
+        # Counters, x = x + n with x a position within the program and n an immediate
+        if opcode == 1 and parameters[2].mode == 0 and 0 <= parameters[2].value < len(self.pristine_memory):
+            target = parameters[2]
+            for source, addend in [parameters[:2], parameters[1::-1]]:
+                if source.mode == 0 and source.value == target.value and addend.mode == 1:
+                    return (self.add_immediate_op, False, False, (target.value, addend.value), 1), length
+
+        # Jumps that are always taken, to an immediate address
+        if opcode in (5, 6) and parameters[0].mode == parameters[1].mode == 1:
+            if (parameters[0].value != 0) == (opcode == 5):
+                return (self.jump_op, False, False, (parameters[1].value,), 1), length
+
+        next_address = address + length
+        if opcode not in (7, 8, 9) or next_address in self.unfused_addresses:
+            return decoded, length
+
+        try:
+            next_opcode = self.memory[next_address] % 100
+            if next_opcode not in (1, 2, 5, 6, 7, 8, 9):
+                return decoded, length
+            next_decoded, next_length = self.read_instruction(next_address)
+        except IndexError:
+            return decoded, length
+
+        if opcode == 9:
+            next_decoded, next_length = self.fuse_instructions(next_address, next_decoded, next_length)
+            fused = (
+                self.relative_base_offset_and_op, False, False,
+                (parameters[0], next_decoded[0]) + next_decoded[3], 1 + next_decoded[4]
+            )
+            return fused, length + next_length
+
+        # The comparison's result has to land outside the jump, or the jump would have to be decoded again. The
+        # jump is taken as read, since fusing it on its own could have turned it into a jump_op.
+        target = parameters[2]
+        if next_opcode in (5, 6) and target.mode == 0 and not next_address <= target.value < next_address + 3:
+            fused = (
+                self.compare_and_jump_op, False, False,
+                (opcode == 8, next_opcode == 5) + parameters + next_decoded[3], 2
+            )
+            return fused, length + next_length
+
+        return decoded, length
+
+    def decode_instruction(self, address: int) -> DecodedInstruction:
+
+        decoded, length = self.fuse_instructions(address, *self.read_instruction(address))
+
+        # Each address is covered by at most one decoded instruction, so decoding an instruction that
+        # overlaps another one (a jump into the middle of an instruction) evicts the other one
+        self.decode_cache[address] = decoded
+        for covered_address in range(address, address + length):
+            previous_address = self.decoded_addresses.get(covered_address, address)
+            if previous_address != address:
+                self.decode_cache.pop(previous_address, None)
+                if previous_address < address:
+                    self.unfused_addresses.add(address)
+            self.decoded_addresses[covered_address] = address
+
+        return decoded
+
+    def invalidate_decoded(self, address: int) -> None:
+        start_address = self.decoded_addresses.pop(address, None)
+        if start_address is not None:
+            self.decode_cache.pop(start_address, None)
+            self.unfused_addresses.add(start_address)
+
+    def clear_decode_cache(self) -> None:
+        self.decode_cache.clear()
+        self.decoded_addresses.clear()
+        self.unfused_addresses.clear()
+
+    def parse_instruction(self) -> DecodedInstruction:
+        decoded = self.decode_cache.get(self.instruction_pointer)
+        if decoded is None:
+            decoded = self.decode_instruction(self.instruction_pointer)
+        return decoded
+
+    def write_memory(self, address: int, value: int) -> None:
+        try:
+            self.memory[address] = value
+        except IndexError:
+            self.memory.expand(address)
+            self.memory[address] = value
+
+        self.dirty_addresses.add(address)
+
+        if address in self.decoded_addresses:
+            self.invalidate_decoded(address)
 
-        self.memory[value] = parameter1.get(self.memory, self.relative_base) + parameter2.get(self.memory, self.relative_base)
+    def add_op(self, parameter1: Parameter, parameter2: Parameter, parameter3: Parameter) -> None:
+        self.write_memory(
+            parameter3.address(self.relative_base),
+            parameter1.get(self.memory, self.relative_base) + parameter2.get(self.memory, self.relative_base)
+        )
         self.instruction_pointer += 4
         return None
 
     def multiply_op(self, parameter1: Parameter, parameter2: Parameter, parameter3: Parameter) -> None:
-        if parameter3.mode == 2:
-            value = parameter3.value + self.relative_base
-        else: 
-            value = parameter3.value
-
-        if value >= len(self.memory):
-            self.memory.extend([0 for _ in range(value - len(self.memory) + 1)])
-
-        self.memory[value] = parameter1.get(self.memory, self.relative_base) * parameter2.get(self.memory, self.relative_base)
+        self.write_memory(
+            parameter3.address(self.relative_base),
+            parameter1.get(self.memory, self.relative_base) * parameter2.get(self.memory, self.relative_base)
+        )
         self.instruction_pointer += 4
         return None
 
     def set_op(self, input_value: int, parameter1: Parameter) -> None:
-        if parameter1.mode == 2:
-            value = parameter1.value + self.relative_base
-        else: 
-            value = parameter1.value
-
-        if value >= len(self.memory):
-            self.memory.extend([0 for _ in range(value - len(self.memory) + 1)])
-
-        self.memory[value] = input_value
+        self.write_memory(parameter1.address(self.relative_base), input_value)
         self.instruction_pointer += 2
 
         return None
@@ -146,129 +499,305 @@ class IntcodeComputer(object):
         return None
 
     def less_than_op(self, parameter1: Parameter, parameter2: Parameter, parameter3: Parameter) -> None:
-        if parameter3.mode == 2:
-            value = parameter3.value + self.relative_base
-        else: 
-            value = parameter3.value
-
-        if value >= len(self.memory):
-            self.memory.extend([0 for _ in range(value - len(self.memory) + 1)])
-
         if parameter1.get(self.memory, self.relative_base) < parameter2.get(self.memory, self.relative_base):
-            self.memory[value] = 1
+            self.write_memory(parameter3.address(self.relative_base), 1)
         else:
-            self.memory[value] = 0
+            self.write_memory(parameter3.address(self.relative_base), 0)
         self.instruction_pointer += 4
 
     def equal_to_op(self, parameter1: Parameter, parameter2: Parameter, parameter3: Parameter) -> None: 
-        if parameter3.mode == 2:
-            value = parameter3.value + self.relative_base
-        else: 
-            value = parameter3.value
-
-        if value >= len(self.memory):
-            self.memory.extend([0 for _ in range(value - len(self.memory) + 1)])
-
         if parameter1.get(self.memory, self.relative_base) == parameter2.get(self.memory, self.relative_base):
-                self.memory[value] = 1
+            self.write_memory(parameter3.address(self.relative_base), 1)
         else:
-            self.memory[value] = 0
+            self.write_memory(parameter3.address(self.relative_base), 0)
         self.instruction_pointer += 4
 
     def relative_base_offset_op(self, parameter1: Parameter) -> None:
         self.relative_base += parameter1.get(self.memory, self.relative_base)
         self.instruction_pointer += 2
 
-    def run(self, *inputs: Tuple[int]) -> List[int]:
+    # Superinstructions, see fuse_instructions
+
+    def jump_op(self, address: int) -> None:
+        self.instruction_pointer = address
+
+    def add_immediate_op(self, address: int, value: int) -> None:
+        self.write_memory(address, self.memory[address] + value)
+        self.instruction_pointer += 4
+
+    def relative_base_offset_and_op(self, parameter1: Parameter, op_function: Callable, *parameters: Parameter) -> None:
+        self.relative_base += parameter1.get(self.memory, self.relative_base)
+        self.instruction_pointer += 2
+        op_function(*parameters)
+
+    def compare_and_jump_op(
+        self, equal: bool, jump_if_true: bool, parameter1: Parameter, parameter2: Parameter, parameter3: Parameter,
+        parameter4: Parameter, parameter5: Parameter
+    ) -> None:
+        memory = self.memory
+        relative_base = self.relative_base
+
+        value1 = parameter1.get(memory, relative_base)
+        value2 = parameter2.get(memory, relative_base)
+        result = value1 == value2 if equal else value1 < value2
+        self.write_memory(parameter3.value, 1 if result else 0)
+
+        if (parameter4.get(memory, relative_base) != 0) == jump_if_true:
+            self.instruction_pointer = parameter5.get(memory, relative_base)
+        else:
+            self.instruction_pointer += 7
+
+    def snapshot(self) -> IntcodeState:
         """
-        Run the program until opcode 99 is reached. Return all outputs produced as a list of integers.
+        Capture the memory, instruction pointer and relative base. With PagedMemory the memory is shared
+        copy-on-write, so this only costs a copy of the page table.
+        """
+        return IntcodeState(self.memory.fork(), self.instruction_pointer, self.relative_base)
+
+    def restore(self, state: IntcodeState) -> None:
+        """
+        Return to a state captured by snapshot. The state can be restored any number of times.
+        """
+        self.memory = state.memory.fork()
+        self.instruction_pointer = state.instruction_pointer
+        self.relative_base = state.relative_base
+        self.clear_decode_cache()
+
+        self.dirty_addresses.clear()
+        self.dirty_addresses_known = False
+
+    def fork(self) -> 'IntcodeComputer':
+        """
+        Return a new computer in the same state as this one, that runs independently from here on.
+        """
+        computer = copy(self)
+        computer.memory = self.memory.fork()
+        computer.dirty_addresses = self.dirty_addresses.copy()
+        computer.initialize_interpreter()
+        return computer
+
+    def reset(self) -> None:
         """
+        Return to the start of the program. Only the addresses written since the last reset are restored from the
+        pristine memory, and only the decoded instructions covering them are thrown away.
+        """
+
+        if self.dirty_addresses_known:
+            self.memory.reset(self.pristine_memory, self.dirty_addresses)
+            for address in self.dirty_addresses:
+                self.invalidate_decoded(address)
+        else:
+            self.memory = self.pristine_memory.fork()
+            self.clear_decode_cache()
 
-        self.memory = self.initial_memory.copy()
+        self.dirty_addresses.clear()
+        self.dirty_addresses_known = True
 
         self.instruction_pointer = 0
-        inputs = list(inputs)
-        inputs.reverse()
+        self.relative_base = 0
 
-        op_function, takes_input, gives_output, parameters = self.parse_instruction()
-        outputs = []
+    def execute(
+        self, inputs: Deque[int], outputs: List[int], stop_on_output: bool=False, budget: Optional[int]=None
+    ) -> int:
+        """
+        Execute instructions from the current instruction pointer, taking inputs from the front of `inputs` and
+        appending outputs to `outputs`. Returns HALTED when opcode 99 is reached, NEEDS_INPUT when an instruction
+        requires input and `inputs` is empty (the instruction pointer is left on that instruction), OUTPUT when
+        `stop_on_output` is set and an output was just produced, or BUDGET_EXHAUSTED once `budget` instructions
+        have been executed.
+        """
+
+        if budget is not None:
+            return self.execute_budgeted(inputs, outputs, stop_on_output, budget)
+
+        op_function, takes_input, gives_output, parameters, _ = self.parse_instruction()
 
         while op_function is not None:
 
-            if takes_input and not gives_output:
-                op_function(inputs.pop(), *parameters)
-            elif not takes_input and gives_output:
-                outputs.append(op_function(*parameters))
-            elif takes_input and gives_output:
-                outputs.append(op_function(inputs.pop(), *parameters))
+            if takes_input:
+                if not inputs:
+                    return NEEDS_INPUT
+                result = op_function(inputs.popleft(), *parameters)
             else:
-                op_function(*parameters)
+                result = op_function(*parameters)
 
-            op_function, takes_input, gives_output, parameters = self.parse_instruction()
+            if gives_output:
+                outputs.append(result)
+                if stop_on_output:
+                    return OUTPUT
 
-        return outputs
+            op_function, takes_input, gives_output, parameters, _ = self.parse_instruction()
 
-    def run_and_halt(self, *inputs: Tuple[int]) -> int:
+        return HALTED
+
+    def execute_budgeted(self, inputs: Deque[int], outputs: List[int], stop_on_output: bool, budget: int) -> int:
         """
-        Run the program until it produces output at which time it will return the output and halt execution.
-        Program state and instruction pointer is maintained between calls. When opcode 99 is reached (program is terminated)
-        this method will return None.
+        The execute loop when there is a budget, counting the instructions run by each superinstruction.
         """
 
-        inputs = list(inputs)
-        inputs.reverse()
+        remaining = budget
 
-        op_function, takes_input, gives_output, parameters = self.parse_instruction()
+        op_function, takes_input, gives_output, parameters, n_instructions = self.parse_instruction()
 
         while op_function is not None:
 
-            if takes_input and not gives_output:
-                op_function(inputs.pop(), *parameters)
-            elif not takes_input and gives_output:
-                return op_function(*parameters)
-            elif takes_input and gives_output:
-                return op_function(inputs.pop(), *parameters)
+            # A superinstruction that doesn't fit in the budget is run as its first instruction alone
+            if remaining < n_instructions:
+                if remaining == 0:
+                    self.budget_left = 0
+                    return BUDGET_EXHAUSTED
+                (op_function, takes_input, gives_output, parameters, n_instructions), _ = self.read_instruction(
+                    self.instruction_pointer
+                )
+            remaining -= n_instructions
+
+            if takes_input:
+                if not inputs:
+                    # The instruction waits for input without running, so it isn't charged
+                    self.budget_left = remaining + n_instructions
+                    return NEEDS_INPUT
+                result = op_function(inputs.popleft(), *parameters)
             else:
-                op_function(*parameters)
+                result = op_function(*parameters)
 
-            op_function, takes_input, gives_output, parameters = self.parse_instruction()
+            if gives_output:
+                outputs.append(result)
+                if stop_on_output:
+                    self.budget_left = remaining
+                    return OUTPUT
 
-        return None
+            op_function, takes_input, gives_output, parameters, n_instructions = self.parse_instruction()
 
-    def run_until_input_required(self, input_value: int=None) -> List[int]:
+        self.budget_left = remaining
+        return HALTED
+
+    # All run methods take an instruction budget, the most instructions they run before returning control (for
+    # stream, before each yield). Going over the budget raises BudgetExhausted, after which run_slice carries on
+    # from where the program stopped.
+
+    def run_slice(self, inputs: Iterable[int]=(), budget: Optional[int]=None) -> RunSlice:
         """
-        Run the program until it requires input at which time it will return the output and halt execution.
+        Run the program from its current state until it halts, needs input beyond `inputs`, or has run `budget`
+        instructions. This is the building block for running many machines in turns.
+        """
+
+        inputs = deque(inputs)
+        outputs = []
+        status = self.execute(inputs, outputs, budget=budget)
+        return RunSlice(status, outputs, inputs)
+
+    def run(self, *inputs: Tuple[int], budget: Optional[int]=None) -> List[int]:
+        """
+        Run the program until opcode 99 is reached. Return all outputs produced as a list of integers.
+        """
+
+        self.reset()
+        run_slice = self.run_slice(inputs, budget)
+
+        if run_slice.status == NEEDS_INPUT:
+            raise IndexError('Program requires more inputs than were given')
+        elif run_slice.status == BUDGET_EXHAUSTED:
+            raise BudgetExhausted(run_slice)
+
+        return run_slice.outputs
+
+    def run_batch(
+        self,
+        batch: Iterable[Tuple[int, ...]],
+        max_workers: Optional[int]=None,
+        chunk_size: Optional[int]=None,
+        budget: Optional[int]=None,
+    ) -> List[List[int]]:
+        """
+        Run the program once for each tuple of inputs in `batch`, returning the outputs of each run in batch order.
+        Every run starts from the pristine memory, but reuses this computer, so only the addresses the last run
+        wrote are restored and the decoded program is kept.
+
+        With max_workers the batch is split into chunks run by a pool of worker processes, each with a single
+        computer of its own. Computers of subclasses taking extra constructor arguments can't be spread over
+        workers.
+        """
+
+        batch = list(batch)
+        if max_workers is None:
+            return [self.run(*inputs, budget=budget) for inputs in batch]
+
+        results = parallel_sweep(
+            partial(_run_batch_inputs, budget=budget),
+            (type(self), self.initial_memory, self.memory_backend),
+            batch,
+            prepare=_prepare_batch_computer,
+            chunk_size=chunk_size,
+            max_workers=max_workers,
+        )
+        return [outputs for _, outputs in results]
+
+    def stream(self, inputs: Iterable[int]=(), budget: Optional[int]=None) -> Iterator[int]:
+        """
+        Run the program from its current state, yielding each output as soon as it is produced. The next input is
+        only taken from `inputs` when an instruction needs it, so inputs can be computed from earlier outputs.
+        Stops when opcode 99 is reached.
+        """
+
+        inputs = iter(inputs)
+        pending_inputs = deque()
+        outputs = []
+
+        # The budget is shared by every execute up to the next yield, however many inputs are taken in between
+        remaining = budget
+
+        while True:
+            status = self.execute(pending_inputs, outputs, stop_on_output=True, budget=remaining)
+            if budget is not None:
+                remaining = self.budget_left
+
+            if status == OUTPUT:
+                yield outputs.pop()
+                remaining = budget
+            elif status == NEEDS_INPUT:
+                try:
+                    pending_inputs.append(next(inputs))
+                except StopIteration:
+                    raise IndexError('Program requires more inputs than were given')
+            elif status == BUDGET_EXHAUSTED:
+                raise BudgetExhausted(RunSlice(status, outputs, pending_inputs))
+            else:
+                return
+
+    def run_and_halt(self, *inputs: Tuple[int], budget: Optional[int]=None) -> int:
+        """
+        Run the program until it produces output at which time it will return the output and halt execution.
         Program state and instruction pointer is maintained between calls. When opcode 99 is reached (program is terminated)
         this method will return None.
         """
 
-        op_function, takes_input, gives_output, parameters = self.parse_instruction()
-        input_used = False
+        inputs = deque(inputs)
         outputs = []
+        status = self.execute(inputs, outputs, stop_on_output=True, budget=budget)
 
-        while op_function is not None:
+        if status == NEEDS_INPUT:
+            raise IndexError('Program requires more inputs than were given')
+        elif status == BUDGET_EXHAUSTED:
+            raise BudgetExhausted(RunSlice(status, outputs, inputs))
+        elif status == OUTPUT:
+            return outputs[0]
 
-            if takes_input and not gives_output:
-                if not input_used and input_value is not None:
-                    op_function(input_value, *parameters)
-                    input_used = True
-                else:
-                    return outputs
-
-            elif not takes_input and gives_output:
-                outputs.append(op_function(*parameters))
-
-            elif takes_input and gives_output:
-                if not input_used and input_value is not None:
-                    outputs.append(op_function(input_value, *parameters))
-                    input_used = True
-                else:
-                    return outputs
-                    
-            else:
-                op_function(*parameters)
+        return None
+
+    def run_until_input_required(self, input_value: int=None, budget: Optional[int]=None) -> List[int]:
+        """
+        Run the program until it requires input at which time it will return the output and halt execution.
+        Program state and instruction pointer is maintained between calls. When opcode 99 is reached (program is terminated)
+        this method will return None.
+        """
+
+        run_slice = self.run_slice(() if input_value is None else (input_value,), budget)
+        outputs = run_slice.outputs
 
-            op_function, takes_input, gives_output, parameters = self.parse_instruction()
+        if run_slice.status == NEEDS_INPUT:
+            return outputs
+        elif run_slice.status == BUDGET_EXHAUSTED:
+            raise BudgetExhausted(run_slice)
 
         if len(outputs) == 0:
             return None
@@ -276,7 +805,446 @@ class IntcodeComputer(object):
             return outputs
 
 
+# Set in each worker process by parallel_sweep, so the program is only sent to a worker once
+_sweep_state: Any = None
+
+
+def _initialize_sweep_worker(prepare: Optional[Callable], program: Any) -> None:
+    global _sweep_state
+    _sweep_state = program if prepare is None else prepare(program)
+
+
+def _sweep_chunk(evaluate: Callable, chunk: List[Any], target: Any) -> List[Tuple[Any, Any]]:
+    results = []
+    for candidate in chunk:
+        result = evaluate(_sweep_state, candidate)
+        results.append((candidate, result))
+        if target is not None and result == target:
+            break
+    return results
+
+
+def parallel_sweep(
+    evaluate: Callable[[Any, Any], Any],
+    program: Any,
+    candidates: Iterable[Any],
+    target: Any=None,
+    prepare: Optional[Callable]=None,
+    chunk_size: Optional[int]=None,
+    max_workers: Optional[int]=None,
+) -> List[Tuple[Any, Any]]:
+    """
+    Evaluate every candidate against the program in a pool of worker processes, returning (candidate, result)
+    pairs in candidate order. The program is sent to each worker once, optionally turned into some other state
+    (e.g. a computer) by prepare, and evaluate is called with that state and a candidate. The candidates are
+    split into chunks, one task per chunk.
+
+    With a target, the sweep stops at the first candidate (in candidate order) whose result equals the target, so
+    the last pair returned is the match. evaluate and prepare have to be picklable, i.e. module level functions.
+    """
+
+    candidates = list(candidates)
+    max_workers = max_workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, ceil(len(candidates) / (4 * max_workers)))
+
+    chunks = [candidates[i:i + chunk_size] for i in range(0, len(candidates), chunk_size)]
+    results = []
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_initialize_sweep_worker, initargs=(prepare, program)
+    ) as executor:
+        futures = [executor.submit(_sweep_chunk, evaluate, chunk, target) for chunk in chunks]
+
+        # Results are collected in order, so a match in a later chunk only counts once every earlier chunk is done
+        for future in futures:
+            chunk_results = future.result()
+            results.extend(chunk_results)
+
+            if target is not None and chunk_results and chunk_results[-1][1] == target:
+                for pending_future in futures:
+                    pending_future.cancel()
+                break
+
+    return results
+
+
+def _prepare_batch_computer(program: Tuple[type, List[int], Callable]) -> IntcodeComputer:
+    # Each run_batch worker process builds a single computer, reused for every run in its chunks
+    computer_class, initial_memory, memory_backend = program
+    return computer_class(initial_memory, memory_backend)
+
+
+def _run_batch_inputs(computer: IntcodeComputer, inputs: Tuple[int, ...], budget: Optional[int]=None) -> List[int]:
+    return computer.run(*inputs, budget=budget)
+
+
+class CompiledIntcodeComputer(IntcodeComputer):
+    """
+    An IntcodeComputer that translates each basic block (a straight run of arithmetic, comparison and relative
+    base instructions, ending at the first jump) into a Python function the first time it is reached. Input,
+    output and halt instructions are run by the interpreter, as are blocks that keep getting overwritten.
+    """
+
+    # Opcodes that can be translated, and the ones among them that end a block
+    block_opcodes = {1, 2, 5, 6, 7, 8, 9}
+    jump_opcodes = {5, 6}
+
+    # After a block has been translated this many times (every rewrite of its code throws it away) it is left
+    # to the interpreter
+    max_translations = 4
+
+    # Generated source -> compiled code, shared between computers since they usually run the same programs
+    code_cache: Dict[str, CodeType] = {}
+
+    # The blocks translated from each program as it was loaded, keyed on program_key and then on the block's start
+    # address: its code, covered addresses and number of instructions. A block found here is installed without
+    # generating its source again. With a cache_directory they're loaded from it the first time a program is run and
+    # saved back at exit, so later processes start warm. Programs in saved_programs have no new blocks to save.
+    cache_directory: Optional[str] = CACHE_DIRECTORY
+    program_code: Dict[str, Dict[int, Tuple[CodeType, List[int], int]]] = {}
+    saved_programs: Set[str] = set()
+    save_registered = False
+
+    def __init__(self, initial_memory: List[int], *args, **kwargs) -> None:
+        super().__init__(initial_memory, *args, **kwargs)
+
+        self.program_key = program_key(initial_memory)
+        if self.program_key is not None and self.program_key not in self.program_code:
+            self.program_code[self.program_key] = self.load_code(self.program_key)
+            self.saved_programs.add(self.program_key)
+
+    @classmethod
+    def code_path(cls, key: str) -> str:
+        # Marshalled code only loads in the Python version that wrote it
+        return os.path.join(cls.cache_directory, f'{key}.{sys.implementation.cache_tag}.blocks')
+
+    @classmethod
+    def load_code(cls, key: str) -> Dict[int, Tuple[CodeType, List[int], int]]:
+        if cls.cache_directory is None:
+            return {}
+        if not cls.save_registered:
+            atexit.register(CompiledIntcodeComputer.save_code)
+            CompiledIntcodeComputer.save_registered = True
+        try:
+            with open(cls.code_path(key), 'rb') as f:
+                return marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+
+    @classmethod
+    def save_code(cls) -> None:
+        if cls.cache_directory is None:
+            return None
+        for key, blocks in cls.program_code.items():
+            if key not in cls.saved_programs:
+                write_cache_file(cls.code_path(key), lambda f: marshal.dump(blocks, f))
+                cls.saved_programs.add(key)
+
+    def initialize_interpreter(self) -> None:
+        super().initialize_interpreter()
+
+        # Translated blocks keyed on their start address, and for every address covered by a block the start
+        # addresses of the blocks covering it. Unlike decoded instructions, blocks often overlap (a jump into
+        # the middle of a block starts a new one).
+        self.blocks: Dict[int, Callable] = {}
+        self.block_lengths: Dict[int, int] = {}
+        self.block_addresses: Dict[int, Set[int]] = {}
+        self.translations: Dict[int, int] = defaultdict(int)
+        self.interpreted_addresses: Set[int] = set()
+
+        # Parameter addresses that have been overwritten while part of a block. Programs often use parameters
+        # as variables, so from then on blocks read these parameters from memory rather than baking them in.
+        self.volatile_addresses: Set[int] = set()
+
+    def clear_decode_cache(self) -> None:
+        super().clear_decode_cache()
+        self.blocks.clear()
+        self.block_lengths.clear()
+        self.block_addresses.clear()
+        self.translations.clear()
+        self.interpreted_addresses.clear()
+        self.volatile_addresses.clear()
+
+    def invalidate_decoded(self, address: int) -> None:
+        super().invalidate_decoded(address)
+
+        for start_address in self.block_addresses.pop(address, ()):
+            self.blocks.pop(start_address, None)
+
+    def write_memory(self, address: int, value: int) -> None:
+        super().write_memory(address, value)
+
+        if address in self.block_addresses:
+            self.volatile_addresses.add(address)
+            self.invalidate_decoded(address)
+
+    def read_source(self, address: int, mode: int) -> str:
+        value = self.memory[address]
+        if address in self.volatile_addresses:
+            if mode == 1:
+                return f'm[{address}]'
+            elif mode == 2:
+                return f'(m[a] if (a := rb + m[{address}]) < len(m) else 0)'
+            else:
+                return f'(m[a] if (a := m[{address}]) < len(m) else 0)'
+        elif mode == 1:
+            return repr(value)
+        elif mode == 2:
+            return f'(m[a] if (a := rb + {value}) < len(m) else 0)'
+        elif 0 <= value < len(self.pristine_memory):
+            # Resetting never shrinks memory below the pristine memory
+            return f'm[{value}]'
+        else:
+            return f'(m[{value}] if {value} < len(m) else 0)'
+
+    def write_source(self, address: int, mode: int, next_address: int, n_instructions: int) -> List[str]:
+        if address in self.volatile_addresses:
+            value = f'm[{address}]'
+        else:
+            value = repr(self.memory[address])
+
+        # A write that overwrites a translated block leaves this block, in case it was the one overwritten
+        return [
+            f'a = rb + {value}' if mode == 2 else f'a = {value}',
+            'if a in bw:',
+            '    w(a, v)',
+            f'    return {next_address}, rb, {n_instructions}',
+            'if a in d or a >= len(m):',
+            '    w(a, v)',
+            'else:',
+            '    m[a] = v',
+            '    t(a)',
+        ]
+
+    def block_source(self, address: int) -> Tuple[Optional[str], List[int], int]:
+        """
+        Generate the source of a function `block(m, rb)` running the basic block starting at `address` and 
+        returning the next instruction pointer, the relative base and the number of instructions it ran (a write
+        to translated code leaves the block early). Also returns the addresses the generated code
+        depends on and the number of instructions in the block.
+        """
+
+        lines = []
+        covered_addresses = []
+        n_instructions = 0
+        instruction_pointer = address
+
+        while instruction_pointer < len(self.memory):
+
+            opcode_parammode = self.memory[instruction_pointer]
+            opcode = opcode_parammode % 100
+            n_params = self.instructions[opcode][3] if opcode in self.block_opcodes else 0
+
+            if n_params == 0 or instruction_pointer + n_params >= len(self.memory):
+                break
+
+            addresses = range(instruction_pointer + 1, instruction_pointer + 1 + n_params)
+            values = [self.memory[address] for address in addresses]
+            modes = [opcode_parammode // 10 ** (i + 2) % 10 for i in range(n_params)]
+            next_address = instruction_pointer + 1 + n_params
+            sources = [self.read_source(address, mode) for address, mode in zip(addresses, modes)]
+
+            covered_addresses.append(instruction_pointer)
+            covered_addresses.extend(address for address in addresses if address not in self.volatile_addresses)
+            n_instructions += 1
+
+            lines.append(f'# {instruction_pointer}: {opcode_parammode} {" ".join(str(v) for v in values)}')
+
+            if opcode == 1:
+                lines.append(f'v = {sources[0]} + {sources[1]}')
+            elif opcode == 2:
+                lines.append(f'v = {sources[0]} * {sources[1]}')
+            elif opcode == 7:
+                lines.append(f'v = 1 if {sources[0]} < {sources[1]} else 0')
+            elif opcode == 8:
+                lines.append(f'v = 1 if {sources[0]} == {sources[1]} else 0')
+            elif opcode == 9:
+                lines.append(f'rb += {sources[0]}')
+            else:
+                comparison = '!=' if opcode == 5 else '=='
+                lines.append(f'if {sources[0]} {comparison} 0:')
+                lines.append(f'    return {sources[1]}, rb, {n_instructions}')
+
+            if opcode in (1, 2, 7, 8):
+                lines.extend(self.write_source(addresses[2], modes[2], next_address, n_instructions))
+
+            instruction_pointer = next_address
+
+            if opcode in self.jump_opcodes:
+                break
+
+        if n_instructions == 0:
+            return None, covered_addresses, 0
+
+        lines.append(f'return {instruction_pointer}, rb, {n_instructions}')
+
+        source = 'def block(m, rb):\n' + '\n'.join('    ' + line for line in lines)
+        return source, covered_addresses, n_instructions
+
+    def is_pristine_block(self, address: int, covered_addresses: List[int]) -> bool:
+        # A block reads no volatile parameters if it covers every address it spans, and then it only depends on
+        # the memory in that span
+        end = address + len(covered_addresses)
+        if covered_addresses != list(range(address, end)) or end > len(self.pristine_memory):
+            return False
+        return all(self.memory[a] == self.pristine_memory[a] for a in range(address, end))
+
+    def translate_block(self, address: int) -> Callable:
+
+        # Addresses the program starts no block at are saved too, as a block without code covering just the address
+        program_blocks = self.program_code.get(self.program_key)
+        cached = program_blocks.get(address) if program_blocks is not None else None
+
+        if cached is not None and self.is_pristine_block(address, cached[1]):
+            code, covered_addresses, n_instructions = cached
+        else:
+            source, covered_addresses, n_instructions = self.block_source(address)
+            if source is None:
+                code, covered_addresses = None, [address]
+            else:
+                code = self.code_cache.get(source)
+                if code is None:
+                    code = compile(source, f'<intcode block {address}>', 'exec')
+                    self.code_cache[source] = code
+
+            if program_blocks is not None and cached is None and self.is_pristine_block(address, covered_addresses):
+                program_blocks[address] = (code, covered_addresses, n_instructions)
+                self.saved_programs.discard(self.program_key)
+
+        if code is None:
+            self.interpreted_addresses.add(address)
+            return None
+
+        namespace = {
+            'w': self.write_memory,
+            't': self.dirty_addresses.add,
+            'd': self.decoded_addresses,
+            'bw': self.block_addresses,
+        }
+        exec(code, namespace)
+        block = namespace['block']
+
+        self.blocks[address] = block
+        self.block_lengths[address] = n_instructions
+        for covered_address in covered_addresses:
+            self.block_addresses.setdefault(covered_address, set()).add(address)
+
+        self.translations[address] += 1
+        if self.translations[address] >= self.max_translations:
+            self.interpreted_addresses.add(address)
+
+        return block
+
+    def execute(
+        self, inputs: Deque[int], outputs: List[int], stop_on_output: bool=False, budget: Optional[int]=None
+    ) -> int:
+
+        blocks = self.blocks
+        interpreted_addresses = self.interpreted_addresses
+        remaining = UNLIMITED if budget is None else budget
+
+        while True:
+
+            block = blocks.get(self.instruction_pointer)
+            if block is None and self.instruction_pointer not in interpreted_addresses:
+                block = self.translate_block(self.instruction_pointer)
+
+            # With a budget, a block only runs if all of it fits, otherwise its instructions are interpreted one by
+            # one until the budget runs out. It's charged for the instructions it ran, which is fewer if it left early.
+            if block is not None:
+                if budget is None:
+                    self.instruction_pointer, self.relative_base, _ = block(self.memory, self.relative_base)
+                    continue
+                elif self.block_lengths[self.instruction_pointer] <= remaining:
+                    self.instruction_pointer, self.relative_base, n_executed = block(self.memory, self.relative_base)
+                    remaining -= n_executed
+                    continue
+
+            op_function, takes_input, gives_output, parameters, n_instructions = self.parse_instruction()
+
+            if op_function is None:
+                self.budget_left = remaining
+                return HALTED
+
+            if remaining < n_instructions:
+                if remaining == 0:
+                    self.budget_left = 0
+                    return BUDGET_EXHAUSTED
+                (op_function, takes_input, gives_output, parameters, n_instructions), _ = self.read_instruction(
+                    self.instruction_pointer
+                )
+            remaining -= n_instructions
+
+            if takes_input:
+                if not inputs:
+                    self.budget_left = remaining + n_instructions
+                    return NEEDS_INPUT
+                result = op_function(inputs.popleft(), *parameters)
+            else:
+                result = op_function(*parameters)
+
+            if gives_output:
+                outputs.append(result)
+                if stop_on_output:
+                    self.budget_left = remaining
+                    return OUTPUT
+
+
+
+class AsyncIntcodeComputer(IntcodeComputer):
+    """
+    An IntcodeComputer for asyncio, taking input from one queue and putting output on another so many machines and
+    their controllers can run concurrently in one event loop. It runs slices of up to `slice_size` instructions,
+    awaiting only when it needs input or has used up a slice.
+
+    Mix in CompiledIntcodeComputer to run slices with the translating engine, i.e.
+    `class AsyncCompiledIntcodeComputer(AsyncIntcodeComputer, CompiledIntcodeComputer)`.
+    """
+
+    def __init__(
+        self,
+        initial_memory: List[int],
+        input_queue: Optional[asyncio.Queue]=None,
+        output_queue: Optional[asyncio.Queue]=None,
+        slice_size: int=10000,
+        memory_backend: Callable=ListMemory
+    ) -> None:
+        super().__init__(initial_memory, memory_backend)
+        self.input_queue = asyncio.Queue() if input_queue is None else input_queue
+        self.output_queue = asyncio.Queue() if output_queue is None else output_queue
+        self.slice_size = slice_size
+
+    async def run_async(self) -> None:
+        """
+        Run the program from its current state until opcode 99 is reached.
+        """
+
+        inputs = deque()
+        outputs = []
+
+        while True:
+            # Inputs that are already waiting are taken without giving up control
+            while not self.input_queue.empty():
+                inputs.append(self.input_queue.get_nowait())
+
+            status = self.execute(inputs, outputs, budget=self.slice_size)
+
+            for output in outputs:
+                await self.output_queue.put(output)
+            outputs.clear()
+
+            if status == HALTED:
+                return
+            elif status == NEEDS_INPUT:
+                inputs.append(await self.input_queue.get())
+            else:
+                await asyncio.sleep(0)
+
+
 if __name__ == '__main__':
+    import tempfile
+    from itertools import count, islice
 
 
     print("Part 1 tests", end='...')
@@ -365,15 +1333,224 @@ if __name__ == '__main__':
     
     print("Passed!")
 
+    print("Self-modifying program tests", end='...')
+    # Output the immediate at address 1, then increment it in place and loop while it's below 3
+    test_program = IntcodeComputer([104,1,1001,1,1,1,1007,1,3,20,1005,20,0,99])
+    test_output = test_program.run()
+    assert test_output == [1, 2]
+    test_output = test_program.run()
+    assert test_output == [1, 2]
+    print("Passed!")
+
+    print("Superinstruction tests", end='...')
+    # The comparison overwrites the jump after it, so the two mustn't run as one
+    assert IntcodeComputer([1108,1,1,5,1106,0,11,104,1,99,0,104,0,99]).run() == [1]
+
+    # A comparison followed by a jump on an immediate condition, which on its own fuses into a jump_op
+    assert IntcodeComputer([1108,1,1,10,1105,1,9,104,0,99,0]).run() == []
+    assert IntcodeComputer([1108,1,2,10,1106,0,9,104,0,99,0]).run() == []
+
+    # The day15 repair robot walks the same as on the compiled engine, which doesn't fuse instructions
+    test_robot = IntcodeComputer(read_program('./inputs/day15.txt'))
+    compiled_robot = CompiledIntcodeComputer(read_program('./inputs/day15.txt'))
+    for direction in [1, 2, 3, 4] * 25 + [4, 4, 3, 3, 1, 1, 2, 2] * 10:
+        assert test_robot.run_until_input_required(direction) == compiled_robot.run_until_input_required(direction)
+
+    # A budget of one runs superinstructions one instruction at a time
+    test_program = [109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99]
+    test_computer = IntcodeComputer(test_program)
+    test_output = []
+    n_steps = 1
+    while test_computer.execute(deque(), test_output, budget=1) == BUDGET_EXHAUSTED:
+        n_steps += 1
+    assert test_output == test_program
+    assert n_steps == 16 * 5
+    print("Passed!")
+
+    print("Memory backend tests", end='...')
+    # Write to and read back from a relative address a billion words past the program
+    for computer_class in [IntcodeComputer, CompiledIntcodeComputer]:
+        for memory_backend in [PagedMemory, ArrayMemory]:
+            test_program = computer_class([109,1000000000,21101,3,4,0,204,0,99], memory_backend)
+            assert test_program.run() == [7]
+            assert test_program.memory[1000000000] == 7
+            assert len(test_program.memory.pages) == 2
+
+    # Squares 2 ** 40 into the last word, which has to be promoted out of 64 bits, then runs again from scratch
+    test_program = IntcodeComputer([1102,2 ** 40,2 ** 40,7,4,7,99,0], ArrayMemory)
+    assert test_program.run() == [2 ** 80]
+    assert isinstance(test_program.memory.pages[0], list)
+    assert test_program.run() == [2 ** 80]
+    assert isinstance(test_program.pristine_memory.pages[0], array)
+    print("Passed!")
+
+    print("Reset tests", end='...')
+    # Each run has to start from the initial memory and relative base, however far the last one wrote
+    test_program = [109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99]
+    for memory_backend in [ListMemory, PagedMemory, ArrayMemory]:
+        test_computer = IntcodeComputer(test_program, memory_backend)
+        assert test_computer.run() == test_program
+        assert test_computer.run() == test_program
+        assert len(test_computer.memory) == 102
+
+        test_computer = IntcodeComputer([1002,4,3,4,33], memory_backend)
+        test_computer.run()
+        test_computer.run()
+        assert list(test_computer.memory) == [1002,4,3,4,99]
+    print("Passed!")
+
+    print("Snapshot and fork tests", end='...')
+    # Echo inputs until a 0 is given, adding each one to a running total kept at address 20
+    test_program = [3,19,1,19,20,20,4,20,1005,19,0,99]
+    for memory_backend in [ListMemory, PagedMemory, ArrayMemory]:
+        test_computer = IntcodeComputer(test_program, memory_backend)
+        assert test_computer.run_until_input_required(5) == [5]
+        state = test_computer.snapshot()
+        forked_computer = test_computer.fork()
+        assert test_computer.run_until_input_required(2) == [7]
+        assert forked_computer.run_until_input_required(3) == [8]
+        test_computer.restore(state)
+        assert test_computer.run_until_input_required(10) == [15]
+        test_computer.restore(state)
+        assert test_computer.run_until_input_required(0) == [5]
+        assert forked_computer.run_until_input_required(0) == [8]
+    print("Passed!")
+
+    print("Streaming tests", end='...')
+    test_program = [109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99]
+    assert list(IntcodeComputer(test_program).stream()) == test_program
+
+    # Doubles its inputs forever, so it can only be run by pulling inputs lazily
+    test_program = IntcodeComputer([3,11,1002,11,2,11,4,11,1105,1,0])
+    assert list(islice(test_program.stream(count(1)), 5)) == [2, 4, 6, 8, 10]
+    print("Passed!")
+
+    print("Async tests", end='...')
+
+    async def feedback_loop(program: List[int]) -> int:
+        # Five copies of the day07 feedback amplifier, each reading from the queue the one before writes to
+        queues = [asyncio.Queue() for _ in range(5)]
+        amplifiers = [
+            AsyncIntcodeComputer(program, queues[i], queues[(i + 1) % 5], slice_size=5) for i in range(5)
+        ]
+        for queue, phase in zip(queues, [9, 8, 7, 6, 5]):
+            queue.put_nowait(phase)
+        queues[0].put_nowait(0)
+
+        await asyncio.gather(*[amplifier.run_async() for amplifier in amplifiers])
+        return queues[0].get_nowait()
+
+    test_program = [3,26,1001,26,-4,26,3,27,1002,27,2,27,1,27,26,27,4,27,1001,28,-1,28,1005,28,6,99,0,0,5]
+    assert asyncio.run(feedback_loop(test_program)) == 139629729
+    print("Passed!")
+
+    print("Compiled engine tests", end='...')
+    test_program = [
+        3,21,1008,21,8,20,1005,20,22,107,8,21,20,1006,20,31,1106,0,36,98,0,0,1002,21,125,20,4,20,1105,1,46,104,999,1105,1,46,1101,1000,1,20,4,20,1105,1,46,98,99
+    ]
+    for test_input in [1, 8, 700]:
+        assert CompiledIntcodeComputer(test_program).run(test_input) == IntcodeComputer(test_program).run(test_input)
+
+    test_program = CompiledIntcodeComputer([104,1,1001,1,1,1,1007,1,3,20,1005,20,0,99])
+    assert test_program.run() == [1, 2]
+    assert test_program.run() == [1, 2]
+
+    # Rewrites the opcode at address 8 from add to multiply while inside the block it belongs to
+    test_program = CompiledIntcodeComputer([1101,0,1102,8,1101,2,3,17,1101,3,4,17,4,17,99,0,0,0])
+    assert test_program.run() == [12]
+    assert test_program.run_and_halt() is None
+    print("Passed!")
+
+    print("Budget tests", end='...')
+    # Reads ten inputs into a running total before its only output, so a stream can't restart its budget for
+    # each input
+    test_program = [3,20,1,20,21,21,1001,22,1,22,1007,22,10,23,1005,23,0,4,21,99,0,0,0,0]
+    for computer_class in [IntcodeComputer, CompiledIntcodeComputer]:
+        assert list(computer_class(test_program).stream(iter(range(1, 11)))) == [55]
+        assert list(computer_class(test_program).stream(iter(range(1, 11)), budget=51)) == [55]
+        assert computer_class(test_program).run_slice(range(1, 11), budget=6).status == BUDGET_EXHAUSTED
+        for budget in [6, 50]:
+            try:
+                list(computer_class(test_program).stream(iter(range(1, 11)), budget=budget))
+                assert False
+            except BudgetExhausted as exhausted:
+                assert exhausted.slice.outputs == []
+
+    # Loops forever, counting up from 1 at address 20
+    test_program = [1001,20,1,20,4,20,1105,1,0]
+    test_computer = IntcodeComputer(test_program)
+    try:
+        test_computer.run(budget=30)
+        assert False
+    except BudgetExhausted as exhausted:
+        assert exhausted.slice.status == BUDGET_EXHAUSTED
+        assert exhausted.slice.outputs == list(range(1, 11))
+    assert test_computer.run_slice(budget=3) == (BUDGET_EXHAUSTED, [11], deque())
+    try:
+        list(test_computer.stream(budget=2))
+        assert False
+    except BudgetExhausted as exhausted:
+        assert exhausted.slice.outputs == []
+
+    # Slices of any size add up to the same run
+    test_program = [3,19,1,19,20,20,4,20,1005,19,0,99]
+    for budget in [1, 2, 3, 5, 100]:
+        test_computer = CompiledIntcodeComputer(test_program)
+        test_inputs = deque([4, 5, 6, 0])
+        test_output = []
+        run_slice = RunSlice(BUDGET_EXHAUSTED, [], test_inputs)
+        while run_slice.status != HALTED:
+            run_slice = test_computer.run_slice(run_slice.inputs, budget)
+            test_output.extend(run_slice.outputs)
+        assert test_output == [4, 9, 15, 15]
+    # The first instruction overwrites its own opcode, which is in the translated block. The block leaves early and
+    # is only charged for the one instruction it ran, so a budget of two runs both instructions on either engine.
+    for computer_class in [IntcodeComputer, CompiledIntcodeComputer]:
+        test_computer = computer_class([107,-3,5,0,22007,1,0,11,99])
+        assert test_computer.execute(deque(), [], budget=2) == HALTED
+        assert test_computer.memory[0] == test_computer.memory[11] == 1
+    print("Passed!")
+
+    print("Batch tests", end='...')
+    test_program = [
+        3,21,1008,21,8,20,1005,20,22,107,8,21,20,1006,20,31,1106,0,36,98,0,0,1002,21,125,20,4,20,1105,1,46,104,999,1105,1,46,1101,1000,1,20,4,20,1105,1,46,98,99
+    ]
+    test_batch = [(test_input,) for test_input in range(20)]
+    test_outputs = [[999]] * 8 + [[1000]] + [[1001]] * 11
+    assert IntcodeComputer(test_program).run_batch(test_batch) == test_outputs
+    assert CompiledIntcodeComputer(test_program, PagedMemory).run_batch(test_batch, max_workers=2) == test_outputs
+    print("Passed!")
+
+    print("Cache tests", end='...')
+    with tempfile.TemporaryDirectory() as cache_directory:
+        # The second read comes from the cached image
+        assert read_program('./inputs/day05.txt', cache_directory) == read_program('./inputs/day05.txt', None)
+        assert len(os.listdir(cache_directory)) == 1
+        assert read_program('./inputs/day05.txt', cache_directory) == read_program('./inputs/day05.txt', None)
+
+        test_program = [104,1,1001,1,1,1,1007,1,3,20,1005,20,0,99]
+        test_key = program_key(test_program)
+        CompiledIntcodeComputer.cache_directory = cache_directory
+        CompiledIntcodeComputer.program_code.pop(test_key, None)
+        CompiledIntcodeComputer(test_program).run()
+        CompiledIntcodeComputer.save_code()
+        assert CompiledIntcodeComputer.load_code(test_key) == CompiledIntcodeComputer.program_code[test_key]
+
+        # A warm start installs the saved blocks without generating their source
+        CompiledIntcodeComputer.program_code.pop(test_key)
+        test_computer = CompiledIntcodeComputer(test_program)
+        test_computer.block_source = None
+        assert test_computer.run() == [1, 2]
+        CompiledIntcodeComputer.cache_directory = CACHE_DIRECTORY
+    print("Passed!")
+
 
     initial_memory = read_program('./inputs/day05.txt')
+    part1_output, part2_output = IntcodeComputer(initial_memory).run_batch([(1,), (5,)])
+
     print("Running part 1: ", end='')
-    program = IntcodeComputer(initial_memory)
-    part1_output = program.run(1)
     print(f'{part1_output[-1]}')
 
 
     print("Running part 2: ", end='')
-    program = IntcodeComputer(initial_memory)
-    part2_output = program.run(5)
     print(f'{part2_output[0]}')
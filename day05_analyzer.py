@@ -0,0 +1,269 @@
+from typing import List, Tuple, Dict, Set, Optional, NamedTuple
+from day05 import IntcodeComputer, CompiledIntcodeComputer, read_program
+from day05 import OPCODE_NAMES
+
+# Static analysis of Intcode programs: disassembly, basic blocks and the control flow graph between them,
+# self-modifying writes and data regions. Jump targets are only known when they're immediates, which is how
+# programs jump within a function. Returns (jumps to an address popped off the stack) are found from the call
+# sequence that pushes the return address, an immediate equal to the address after a jump that's always taken.
+
+WRITING_OPCODES = {1, 2, 3, 7, 8}
+JUMP_OPCODES = {5, 6}
+
+
+class Instruction(NamedTuple):
+    address: int
+    opcode: int
+    modes: Tuple[int, ...]
+    operands: Tuple[int, ...]
+
+    @property
+    def length(self) -> int:
+        return 1 + len(self.operands)
+
+    @property
+    def next_address(self) -> int:
+        return self.address + self.length
+
+    @property
+    def jump_target(self) -> Optional[int]:
+        # The address a jump goes to, if it's an immediate
+        if self.opcode in JUMP_OPCODES and self.modes[1] == 1:
+            return self.operands[1]
+        return None
+
+    @property
+    def always_jumps(self) -> bool:
+        return self.opcode in JUMP_OPCODES and self.modes[0] == 1 and (self.operands[0] != 0) == (self.opcode == 5)
+
+    @property
+    def written_address(self) -> Optional[int]:
+        # The address a write goes to, if it's known before running (position mode)
+        if self.opcode in WRITING_OPCODES and self.modes[-1] == 0:
+            return self.operands[-1]
+        return None
+
+    def __str__(self) -> str:
+        operands = []
+        for mode, operand in zip(self.modes, self.operands):
+            operands.append([f'[{operand}]', f'{operand}', f'[rb{operand:+}]'][mode] if mode < 3 else f'?{operand}')
+        return f'{self.address:>6}: {OPCODE_NAMES[self.opcode]:<20} {", ".join(operands)}'
+
+
+class BasicBlock(NamedTuple):
+    start: int
+    instructions: List[Instruction]
+    successors: Set[int]
+
+    @property
+    def end(self) -> int:
+        return self.instructions[-1].next_address
+
+
+class ProgramAnalysis(NamedTuple):
+    instructions: Dict[int, Instruction]
+    blocks: Dict[int, BasicBlock]
+
+    # Jumps whose target is only known when running, return sites found from call sequences, and addresses
+    # the code runs into that don't hold a valid instruction (until the program writes one there)
+    indirect_jumps: List[int]
+    return_sites: Set[int]
+    invalid_addresses: Set[int]
+
+    # Instruction address -> the code address it writes to, for position mode writes into the program's code.
+    # Relative mode writes go to the stack, which is assumed to stay clear of the code.
+    self_modifying_writes: Dict[int, int]
+
+    # (start, end) ranges of the program that no reachable instruction covers
+    data_regions: List[Tuple[int, int]]
+
+    # Blocks that can be compiled before running: nothing writes to their opcodes. Written operands are read
+    # from memory by compiled code, see precompile.
+    precompilable_blocks: List[int]
+
+
+def disassemble(memory: List[int], address: int, parameter_counts: Dict[int, int]) -> Optional[Instruction]:
+    """
+    Decode the instruction at `address`, or return None if it isn't a valid instruction.
+    """
+
+    if not 0 <= address < len(memory):
+        return None
+
+    opcode = memory[address] % 100
+    n_params = parameter_counts.get(opcode)
+    if n_params is None or address + n_params >= len(memory):
+        return None
+
+    modes = tuple(memory[address] // 10 ** (i + 2) % 10 for i in range(n_params))
+    if any(mode > 2 for mode in modes):
+        return None
+
+    return Instruction(address, opcode, modes, tuple(memory[address + 1:address + 1 + n_params]))
+
+
+def analyze(memory: List[int]) -> ProgramAnalysis:
+
+    # The day05 instruction table knows how many parameters each opcode takes
+    parameter_counts = {
+        opcode: n_params for opcode, (_, _, _, n_params) in IntcodeComputer([99]).instructions.items()
+    }
+
+    instructions: Dict[int, Instruction] = {}
+    leaders = {0}
+    indirect_jumps = []
+    return_sites = set()
+    invalid_addresses = set()
+    pending = [0]
+
+    while pending:
+
+        # Follow the code from each entry point until it stops, jumps away or joins code already seen
+        address = pending.pop()
+        while address not in instructions:
+            instruction = disassemble(memory, address, parameter_counts)
+            if instruction is None:
+                invalid_addresses.add(address)
+                break
+            instructions[address] = instruction
+
+            if instruction.opcode == 99:
+                break
+            if instruction.opcode in JUMP_OPCODES:
+                leaders.add(instruction.next_address)
+                if instruction.jump_target is not None:
+                    leaders.add(instruction.jump_target)
+                    pending.append(instruction.jump_target)
+                else:
+                    indirect_jumps.append(address)
+                if instruction.always_jumps:
+                    break
+            address = instruction.next_address
+
+        # Once no entry points are left, calls give the return sites
+        if not pending:
+            after_calls = {
+                instruction.next_address for instruction in instructions.values()
+                if instruction.always_jumps and instruction.jump_target is not None
+            }
+            immediates = {
+                operand for instruction in instructions.values()
+                for mode, operand in zip(instruction.modes, instruction.operands) if mode == 1
+            }
+            for address in (after_calls & immediates) - instructions.keys():
+                return_sites.add(address)
+                leaders.add(address)
+                pending.append(address)
+
+    # Split the code into blocks at every leader and after every jump
+    blocks = {}
+    for start in sorted(leaders & instructions.keys()):
+        block_instructions = []
+        address = start
+        while address in instructions and (address == start or address not in leaders):
+            instruction = instructions[address]
+            block_instructions.append(instruction)
+            if instruction.opcode == 99 or instruction.opcode in JUMP_OPCODES:
+                break
+            address = instruction.next_address
+
+        last = block_instructions[-1]
+        successors = set()
+        if last.opcode in JUMP_OPCODES and last.jump_target is not None:
+            successors.add(last.jump_target)
+        if last.opcode != 99 and not last.always_jumps and last.next_address in instructions:
+            successors.add(last.next_address)
+        blocks[start] = BasicBlock(start, block_instructions, successors)
+
+    code_addresses = {
+        address for instruction in instructions.values()
+        for address in range(instruction.address, instruction.next_address)
+    }
+    self_modifying_writes = {
+        instruction.address: instruction.written_address for instruction in instructions.values()
+        if instruction.written_address in code_addresses or instruction.written_address in invalid_addresses
+    }
+
+    data_regions = []
+    for address in range(len(memory)):
+        if address not in code_addresses:
+            if data_regions and data_regions[-1][1] == address:
+                data_regions[-1] = (data_regions[-1][0], address + 1)
+            else:
+                data_regions.append((address, address + 1))
+
+    written_opcodes = set(self_modifying_writes.values()) & instructions.keys()
+    precompilable_blocks = [
+        start for start, block in blocks.items()
+        if not any(instruction.address in written_opcodes for instruction in block.instructions)
+    ]
+
+    return ProgramAnalysis(
+        instructions, blocks, indirect_jumps, return_sites, invalid_addresses, self_modifying_writes, data_regions,
+        precompilable_blocks
+    )
+
+
+def precompile(computer: CompiledIntcodeComputer, analysis: ProgramAnalysis) -> int:
+    """
+    Translate the precompilable blocks of a computer's program before it runs, with the operands the program
+    writes to marked volatile so the translations survive those writes. Returns the number of blocks translated.
+    """
+
+    computer.volatile_addresses.update(
+        address for address in analysis.self_modifying_writes.values() if address not in analysis.instructions
+    )
+
+    n_translated = 0
+    for start in analysis.precompilable_blocks:
+        if start not in computer.blocks and computer.translate_block(start) is not None:
+            n_translated += 1
+    return n_translated
+
+
+def report(analysis: ProgramAnalysis) -> str:
+    n_edges = sum(len(block.successors) for block in analysis.blocks.values())
+    lines = [
+        f'Instructions: {len(analysis.instructions)}',
+        f'Basic blocks: {len(analysis.blocks)}, control flow edges: {n_edges}',
+        f'Indirect jumps: {len(analysis.indirect_jumps)}, return sites: {len(analysis.return_sites)}',
+        f'Invalid instructions reached at: {", ".join(str(address) for address in sorted(analysis.invalid_addresses))}',
+        f'Self-modifying writes: {len(analysis.self_modifying_writes)}',
+    ]
+    for address, target in sorted(analysis.self_modifying_writes.items()):
+        lines.append(f'  {analysis.instructions[address]}  (writes {target})')
+    lines.append(f'Precompilable blocks: {len(analysis.precompilable_blocks)} of {len(analysis.blocks)}')
+    lines.append(f'Data regions: {", ".join(f"{start}-{end - 1}" for start, end in analysis.data_regions)}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import sys
+
+    print("Analyzer tests", end='...')
+    # Jumps over a data word at 9 to a loop counting address 9 down to 0, via a self-modifying write to 17
+    test_program = [1105,1,10,0,0,0,0,0,0,3,1001,9,-1,9,1101,0,0,17,1005,9,10,99]
+    analysis = analyze(test_program)
+    assert sorted(analysis.blocks) == [0, 10, 21]
+    assert analysis.blocks[0].successors == {10}
+    assert analysis.blocks[10].successors == {10, 21}
+    assert analysis.self_modifying_writes == {14: 17}
+    assert analysis.data_regions == [(3, 10)]
+    assert analysis.precompilable_blocks == [0, 10, 21]
+
+    # Calls a function at 12 that returns with a jump to the address on the top of the stack
+    test_program = [109,100,21101,9,0,0,1105,1,12,99,0,0,2105,1,0]
+    analysis = analyze(test_program)
+    assert analysis.return_sites == {9}
+    assert analysis.indirect_jumps == [12]
+    assert sorted(analysis.blocks) == [0, 9, 12]
+    print("Passed!")
+
+    for day in [sys.argv[1]] if len(sys.argv) > 1 else ['05', '09', '13']:
+        print(f'\nday{day}:')
+        program = read_program(f'./inputs/day{day}.txt')
+        analysis = analyze(program)
+        print(report(analysis))
+
+        computer = CompiledIntcodeComputer(program)
+        print(f'Precompiled {precompile(computer, analysis)} blocks')
@@ -0,0 +1,145 @@
+from typing import List, Tuple, Deque, Optional
+from collections import Counter
+from time import perf_counter
+from day05 import IntcodeComputer, CompiledIntcodeComputer, read_program
+from day05 import OPCODE_NAMES, HALTED, NEEDS_INPUT, BUDGET_EXHAUSTED
+
+# Profiles where an Intcode program spends its time. Profiling lives in a subclass so IntcodeComputer itself pays
+# nothing for it.
+
+
+class IntcodeProfile(object):
+    def __init__(self) -> None:
+        self.instructions = 0
+        self.opcode_counts: Counter = Counter()
+        self.address_counts: Counter = Counter()
+
+        # Basic blocks are counted when they're entered, i.e. at the first instruction and after every jump
+        self.block_counts: Counter = Counter()
+
+        # Jumps back to a lower address, keyed on (target, jump address). Each one closes a loop.
+        self.loop_counts: Counter = Counter()
+
+        # Tuples are (instruction address, memory size before, memory size after)
+        self.memory_growth: List[Tuple[int, int, int]] = []
+
+        # Tuples are ('input' or 'output', instructions since the last I/O, seconds since the last I/O)
+        self.io_events: List[Tuple[str, int, float]] = []
+
+        self.last_io_instructions = 0
+        self.last_io_time = perf_counter()
+
+    def record_io(self, kind: str) -> None:
+        now = perf_counter()
+        self.io_events.append((kind, self.instructions - self.last_io_instructions, now - self.last_io_time))
+        self.last_io_instructions = self.instructions
+        self.last_io_time = now
+
+    def report(self, n_top: int=10) -> str:
+        lines = [f'Instructions executed: {self.instructions}', '', 'By opcode:']
+        for opcode, count in self.opcode_counts.most_common():
+            lines.append(f'  {OPCODE_NAMES.get(opcode, opcode):>22} {count:>12} {count / self.instructions:>7.1%}')
+
+        lines.extend(['', 'Hottest addresses:'])
+        for address, count in self.address_counts.most_common(n_top):
+            lines.append(f'  {address:>8} {count:>12}')
+
+        lines.extend(['', 'Hottest basic blocks (by entries):'])
+        for address, count in self.block_counts.most_common(n_top):
+            lines.append(f'  {address:>8} {count:>12}')
+
+        lines.extend(['', 'Hottest loops (by iterations):'])
+        for (target, jump_address), count in self.loop_counts.most_common(n_top):
+            lines.append(f'  {target:>8} - {jump_address:<8} {count:>12}')
+
+        lines.extend(['', f'Memory growth events: {len(self.memory_growth)}'])
+        if self.memory_growth:
+            address, _, size = max(self.memory_growth, key=lambda event: event[2] - event[1])
+            lines.append(f'  Largest: to {size} words at instruction {address}')
+
+        lines.extend(['', f'I/O events: {len(self.io_events)}'])
+        if self.io_events:
+            longest = max(self.io_events, key=lambda event: event[1])
+            lines.append(f'  Longest gap: {longest[1]} instructions ({longest[2] * 1000:.3f} ms) before {longest[0]}')
+
+        return '\n'.join(lines)
+
+
+class ProfilingIntcodeComputer(IntcodeComputer):
+    """
+    An IntcodeComputer that records a profile of the instructions it executes. It interprets one instruction at a
+    time, so it's much slower than IntcodeComputer and only meant for finding out where time goes.
+    """
+
+    def __init__(self, initial_memory: List[int], *args, **kwargs) -> None:
+        super().__init__(initial_memory, *args, **kwargs)
+        self.profile = IntcodeProfile()
+
+    def execute(
+        self, inputs: Deque[int], outputs: List[int], stop_on_output: bool=False, budget: Optional[int]=None
+    ) -> int:
+
+        profile = self.profile
+        jumped = profile.instructions == 0
+        executed = 0
+
+        while budget is None or executed < budget:
+
+            address = self.instruction_pointer
+            try:
+                opcode = self.memory[address] % 100
+            except IndexError:
+                opcode = 0
+            memory_size = len(self.memory)
+
+            status = super().execute(inputs, outputs, stop_on_output, budget=1)
+
+            # Stopping at a halt or at an input with none available doesn't execute anything
+            if status == NEEDS_INPUT or (status == HALTED and opcode == 99):
+                self.budget_left = 0 if budget is None else budget - executed
+                return status
+
+            executed += 1
+            profile.instructions += 1
+            profile.opcode_counts[opcode] += 1
+            profile.address_counts[address] += 1
+
+            if jumped:
+                profile.block_counts[address] += 1
+            jumped = opcode in (5, 6)
+            if jumped and self.instruction_pointer <= address:
+                profile.loop_counts[(self.instruction_pointer, address)] += 1
+
+            if len(self.memory) > memory_size:
+                profile.memory_growth.append((address, memory_size, len(self.memory)))
+
+            if opcode == 3:
+                profile.record_io('input')
+            elif opcode == 4:
+                profile.record_io('output')
+
+            if status != BUDGET_EXHAUSTED:
+                self.budget_left = 0 if budget is None else budget - executed
+                return status
+
+        self.budget_left = 0
+        return BUDGET_EXHAUSTED
+
+
+if __name__ == '__main__':
+
+    # Counts match a hand trace: the loop at 2-12 runs twice, jumping back once
+    test_computer = ProfilingIntcodeComputer([104,1,1001,1,1,1,1007,1,3,20,1005,20,0,99])
+    assert test_computer.run() == [1, 2]
+    profile = test_computer.profile
+    assert profile.instructions == 8
+    assert profile.opcode_counts == Counter({4: 2, 1: 2, 7: 2, 5: 2})
+    assert profile.block_counts == Counter({0: 2})
+    assert profile.loop_counts == Counter({(0, 10): 1})
+    assert len(profile.memory_growth) == 1
+    assert [event[:2] for event in profile.io_events] == [('output', 1), ('output', 4)]
+
+    program = read_program('./inputs/day09.txt')
+    computer = ProfilingIntcodeComputer(program)
+    assert computer.run(2) == CompiledIntcodeComputer(program).run(2)
+    print(computer.profile.report())
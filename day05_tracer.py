@@ -0,0 +1,306 @@
+from typing import List, Tuple, Dict, Iterator, NamedTuple
+from struct import Struct, error as StructError
+import marshal
+import os
+from day05 import IntcodeComputer, IntcodeState, ListMemory, DecodedInstruction, read_program
+from day05 import OPCODE_NAMES
+
+# Records every instruction an Intcode program executes, so a run can be rebuilt at any step without running its
+# I/O drivers again. Like profiling, tracing lives in a subclass so IntcodeComputer itself pays nothing for it.
+
+
+class TraceRecord(NamedTuple):
+    instruction_pointer: int
+    instruction: int
+    operands: Tuple[int, int, int]
+    written_address: int
+    written_value: int
+    next_instruction_pointer: int
+    relative_base: int
+
+
+# A record is packed as 64 bit words: the instruction pointer, the instruction, three operands (0 past the end of
+# the instruction), the address written (-1 if none) and the value written, then the instruction pointer and
+# relative base after the instruction. Records with a field too big for 64 bits are kept in a side table instead,
+# with an instruction pointer of LARGE_RECORD in the buffer.
+RECORD = Struct('<9q')
+LARGE_RECORD = -1
+
+# The buffer starts empty and doubles as records are added until it holds `capacity` of them, starting with this many
+MIN_GROWTH = 1024
+
+# A saved trace starts with its capacity, the number of instructions traced, and the checkpoint instruction pointer
+# and relative base. The buffer follows, then the checkpoint memory and the side table, marshalled.
+HEADER = Struct('<4q')
+
+
+class IntcodeTrace(object):
+    """
+    A ring buffer of the last `capacity` instructions executed, and a checkpoint of the state before the oldest one.
+    Once the buffer is full, each record that gets overwritten is applied to the checkpoint first. The buffer only
+    grows as far as the records need, so short traces (and forks) stay small.
+    """
+
+    def __init__(self, memory: List[int], capacity: int=1000000) -> None:
+        self.capacity = capacity
+        self.buffer = bytearray()
+        self.restart(memory)
+
+    def restart(self, memory: List[int], instruction_pointer: int=0, relative_base: int=0) -> None:
+        self.checkpoint_memory = list(memory)
+        self.checkpoint_instruction_pointer = instruction_pointer
+        self.checkpoint_relative_base = relative_base
+        self.n_records = 0
+        self.large_records: Dict[int, Tuple[int, ...]] = {}
+
+        # Where the next record goes, and whether the buffer has wrapped around so that's the oldest record
+        self.offset = 0
+        self.full = False
+
+    @property
+    def first_step(self) -> int:
+        return max(0, self.n_records - self.capacity)
+
+    def append(
+        self, instruction_pointer: int, instruction: int, operand1: int, operand2: int, operand3: int,
+        written_address: int, written_value: int, next_instruction_pointer: int, relative_base: int
+    ) -> None:
+
+        offset = self.offset
+        if offset == len(self.buffer):
+            size = len(self.buffer)
+            self.buffer.extend(bytes(min(max(size, MIN_GROWTH * RECORD.size), self.capacity * RECORD.size - size)))
+
+        if self.full:
+            fields = self.fields(self.n_records - self.capacity)
+            self.large_records.pop(self.n_records - self.capacity, None)
+            self.apply(self.checkpoint_memory, fields[5], fields[6])
+            self.checkpoint_instruction_pointer, self.checkpoint_relative_base = fields[7:]
+
+        fields = (
+            instruction_pointer, instruction, operand1, operand2, operand3,
+            written_address, written_value, next_instruction_pointer, relative_base
+        )
+        try:
+            RECORD.pack_into(self.buffer, offset, *fields)
+        except StructError:
+            RECORD.pack_into(self.buffer, offset, LARGE_RECORD, *[0] * 8)
+            self.large_records[self.n_records] = fields
+        self.n_records += 1
+
+        self.offset = offset + RECORD.size
+        if self.offset == self.capacity * RECORD.size:
+            self.offset = 0
+            self.full = True
+
+    @staticmethod
+    def apply(memory: List[int], written_address: int, written_value: int) -> None:
+        if written_address >= 0:
+            if written_address >= len(memory):
+                memory.extend([0] * (written_address + 1 - len(memory)))
+            memory[written_address] = written_value
+
+    def fields(self, step: int) -> Tuple[int, ...]:
+        fields = RECORD.unpack_from(self.buffer, step % self.capacity * RECORD.size)
+        if fields[0] == LARGE_RECORD:
+            return self.large_records[step]
+        return fields
+
+    def records(self, start: int=None, stop: int=None) -> Iterator[TraceRecord]:
+        """
+        The records of steps `start` up to `stop`, by default all the steps still in the buffer.
+        """
+
+        start = self.first_step if start is None else start
+        stop = self.n_records if stop is None else stop
+        if not self.first_step <= start <= stop <= self.n_records:
+            raise IndexError(f'Steps {start} to {stop} are not all in the trace')
+
+        for step in range(start, stop):
+            fields = self.fields(step)
+            yield TraceRecord(fields[0], fields[1], fields[2:5], *fields[5:])
+
+    def state_at(self, step: int) -> IntcodeState:
+        """
+        Rebuild the state of the computer before the instruction at `step` (counting from 0) was executed. Steps
+        that have dropped out of the buffer can't be rebuilt.
+        """
+
+        memory = ListMemory(self.checkpoint_memory)
+        instruction_pointer = self.checkpoint_instruction_pointer
+        relative_base = self.checkpoint_relative_base
+
+        for record in self.records(self.first_step, step):
+            self.apply(memory, record.written_address, record.written_value)
+            instruction_pointer = record.next_instruction_pointer
+            relative_base = record.relative_base
+
+        return IntcodeState(memory, instruction_pointer, relative_base)
+
+    def save(self, filename: str) -> None:
+        with open(filename, 'wb') as f:
+            f.write(HEADER.pack(
+                self.capacity, self.n_records, self.checkpoint_instruction_pointer, self.checkpoint_relative_base
+            ))
+            f.write(memoryview(self.buffer)[:min(self.n_records, self.capacity) * RECORD.size])
+            marshal.dump((self.checkpoint_memory, self.large_records), f)
+
+    @classmethod
+    def load(cls, filename: str) -> 'IntcodeTrace':
+        with open(filename, 'rb') as f:
+            capacity, n_records, instruction_pointer, relative_base = HEADER.unpack(f.read(HEADER.size))
+            trace = cls([], capacity)
+            trace.buffer = bytearray(f.read(min(n_records, capacity) * RECORD.size))
+            trace.checkpoint_memory, trace.large_records = marshal.load(f)
+
+            trace.checkpoint_instruction_pointer = instruction_pointer
+            trace.checkpoint_relative_base = relative_base
+            trace.n_records = n_records
+            trace.offset = n_records % capacity * RECORD.size
+            trace.full = n_records >= capacity
+
+        return trace
+
+
+def format_record(step: int, record: TraceRecord) -> str:
+    opcode = record.instruction % 100
+    line = f'{step:>10} {record.instruction_pointer:>6}: {OPCODE_NAMES.get(opcode, opcode):<20}'
+    line += ' '.join(f'{operand:>6}' for operand in record.operands)
+    if record.written_address >= 0:
+        line += f'    [{record.written_address}] = {record.written_value}'
+    return line
+
+
+class TracingIntcodeComputer(IntcodeComputer):
+    """
+    An IntcodeComputer that records each instruction it executes in `trace`. Instructions aren't fused, so each
+    record is a single instruction. A run that starts over with reset or restore starts a new trace.
+    """
+
+    def __init__(self, initial_memory: List[int], *args, capacity: int=1000000, **kwargs) -> None:
+        super().__init__(initial_memory, *args, **kwargs)
+        self.trace = IntcodeTrace(self.initial_memory, capacity)
+        self.written_address = -1
+        self.written_value = 0
+
+    def read_instruction(self, address: int) -> Tuple[DecodedInstruction, int]:
+
+        (op_function, takes_input, gives_output, parameters, n_instructions), length = super().read_instruction(address)
+        if op_function is None:
+            return (op_function, takes_input, gives_output, parameters, n_instructions), length
+
+        # The instruction's words can only change by writing to them, which throws this decoded instruction away
+        instruction, *operands = [self.memory[address + i] for i in range(length)]
+        operand1, operand2, operand3 = operands + [0] * (3 - len(operands))
+
+        # Restarting a trace keeps the same IntcodeTrace, only forks get a new one (and a new decode cache)
+        append = self.trace.append
+
+        def traced_op(*args: int) -> int:
+            self.written_address = -1
+            self.written_value = 0
+            result = op_function(*args)
+            append(
+                address, instruction, operand1, operand2, operand3, self.written_address, self.written_value,
+                self.instruction_pointer, self.relative_base
+            )
+            return result
+
+        return (traced_op, takes_input, gives_output, parameters, n_instructions), length
+
+    def fuse_instructions(
+        self, address: int, decoded: DecodedInstruction, length: int
+    ) -> Tuple[DecodedInstruction, int]:
+        return decoded, length
+
+    def write_memory(self, address: int, value: int) -> None:
+        super().write_memory(address, value)
+        self.written_address = address
+        self.written_value = value
+
+    def reset(self) -> None:
+        super().reset()
+        self.trace.restart(self.memory)
+
+    def restore(self, state: IntcodeState) -> None:
+        super().restore(state)
+        self.trace.restart(self.memory, self.instruction_pointer, self.relative_base)
+
+    def fork(self) -> 'TracingIntcodeComputer':
+        computer = super().fork()
+        computer.trace = IntcodeTrace(computer.memory, self.trace.capacity)
+        computer.trace.restart(computer.memory, computer.instruction_pointer, computer.relative_base)
+        return computer
+
+
+if __name__ == '__main__':
+    import sys
+    import tempfile
+
+    # Replay a saved trace: `python day05_tracer.py trace_file [first step] [last step]`
+    if len(sys.argv) > 1:
+        trace = IntcodeTrace.load(sys.argv[1])
+        start = int(sys.argv[2]) if len(sys.argv) > 2 else trace.first_step
+        stop = int(sys.argv[3]) + 1 if len(sys.argv) > 3 else trace.n_records
+        for step, record in enumerate(trace.records(start, stop), start):
+            print(format_record(step, record))
+        sys.exit()
+
+    print("Trace tests", end='...')
+    # Adds its inputs to a running total at address 20 until a 0 is given. The tiny buffer wraps around.
+    test_computer = TracingIntcodeComputer([3,19,1,19,20,20,4,20,1005,19,0,99], capacity=8)
+    assert test_computer.run_until_input_required(5) == [5]
+    state = test_computer.snapshot()
+    step = test_computer.trace.n_records
+    assert test_computer.run_until_input_required(7) == [12]
+    assert test_computer.run_until_input_required(0) == [12]
+
+    assert test_computer.trace.n_records == 12
+    assert [record.instruction % 100 for record in test_computer.trace.records()] == [3, 1, 4, 5] * 2
+    replayed = test_computer.trace.state_at(step)
+    assert list(replayed.memory) == list(state.memory)
+    assert replayed[1:] == state[1:]
+    final = test_computer.trace.state_at(test_computer.trace.n_records)
+    assert list(final.memory) == list(test_computer.memory)
+    assert final[1:] == test_computer.snapshot()[1:]
+
+    # Restoring a replayed state carries on exactly as the traced run did, without driving its inputs
+    test_computer.restore(test_computer.trace.state_at(8))
+    assert test_computer.run_until_input_required(0) == [12]
+
+    with tempfile.TemporaryDirectory() as directory:
+        trace_file = os.path.join(directory, 'test.trace')
+        test_computer.trace.save(trace_file)
+        loaded = IntcodeTrace.load(trace_file)
+        assert list(loaded.records()) == list(test_computer.trace.records())
+        assert loaded.state_at(loaded.n_records) == test_computer.trace.state_at(test_computer.trace.n_records)
+
+    # Values too big for a 64 bit record go in the side table, and leave it when they drop off the buffer
+    test_program = [1102,2**40,2**40,15,4,15,1101,1,1,16,1101,1,1,16,99,0,0]
+    test_computer = TracingIntcodeComputer(test_program, capacity=8)
+    assert test_computer.run() == [2**80]
+    assert list(test_computer.trace.large_records) == [0]
+    assert test_computer.trace.state_at(1).memory[15] == 2**80
+    with tempfile.TemporaryDirectory() as directory:
+        trace_file = os.path.join(directory, 'large.trace')
+        test_computer.trace.save(trace_file)
+        assert list(IntcodeTrace.load(trace_file).records()) == list(test_computer.trace.records())
+
+    test_computer = TracingIntcodeComputer(test_program, capacity=2)
+    assert test_computer.run() == [2**80]
+    assert test_computer.trace.large_records == {}
+    assert test_computer.trace.checkpoint_memory[15] == 2**80
+    print("Passed!")
+
+    # Forks start with an empty buffer, however big the trace they're forked from
+    assert len(test_computer.fork().trace.buffer) == 0
+
+    program = read_program('./inputs/day09.txt')
+    computer = TracingIntcodeComputer(program)
+    assert computer.run(2) == IntcodeComputer(program).run(2)
+    assert len(computer.trace.buffer) < computer.trace.capacity * RECORD.size
+    final = computer.trace.state_at(computer.trace.n_records)
+    assert list(final.memory) == list(computer.memory)
+    print(f'Traced {computer.trace.n_records} instructions of the day09 BOOST program, the last ones:')
+    for step, record in enumerate(computer.trace.records(computer.trace.n_records - 5), computer.trace.n_records - 5):
+        print(format_record(step, record))
@@ -1,40 +1,146 @@
-from typing import List
+from typing import List, Dict, Tuple, Optional
+from collections import deque
 from itertools import permutations
-from day05 import IntcodeComputer, read_program
+from day05 import IntcodeComputer, read_program, parallel_sweep, HALTED, NEEDS_INPUT, OUTPUT
+
 
+class Channel(object):
+    """
+    A FIFO queue of values sent from one or more machines to another. A bounded channel stops the machines
+    writing to it while it is full.
+    """
+
+    def __init__(self, capacity: Optional[int]=None) -> None:
+        self.values: deque = deque()
+        self.capacity = capacity
 
-def run_amplifiers(program: List[int], input_value: int, phases: List[int]) -> int:
+    def full(self) -> bool:
+        return self.capacity is not None and len(self.values) >= self.capacity
+
+
+class Machine(object):
+    def __init__(self, computer: IntcodeComputer, inputs: Channel) -> None:
+        self.computer = computer
+        self.inputs = inputs
+        self.destinations: List[Channel] = []
+        self.status: Optional[int] = None  # None until the machine first runs
+        self.last_output: Optional[int] = None
+
+
+class IntcodeNetwork(object):
+    """
+    Intcode machines wired together by channels in any topology. Every output of a machine is sent to each
+    channel connected to it. Machines take turns, each running until it halts, needs input its channel doesn't
+    have yet, or has filled a bounded channel.
+    """
+
+    def __init__(self) -> None:
+        self.machines: List[Machine] = []
+
+    def add_machine(
+        self, computer: IntcodeComputer, initial_inputs: List[int]=(), capacity: Optional[int]=None
+    ) -> Machine:
+        machine = Machine(computer, Channel(capacity))
+        machine.inputs.values.extend(initial_inputs)
+        self.machines.append(machine)
+        return machine
+
+    def connect(self, source: Machine, destination: Machine) -> None:
+        source.destinations.append(destination.inputs)
+
+    def runnable(self, machine: Machine) -> bool:
+        if machine.status == HALTED:
+            return False
+        if machine.status == NEEDS_INPUT and not machine.inputs.values:
+            return False
+        return not any(channel.full() for channel in machine.destinations)
+
+    def run_machine(self, machine: Machine) -> None:
+
+        # With only unbounded channels a machine can run until it blocks on input, otherwise it has to stop after
+        # each output to check there is room for the next one
+        bounded = any(channel.capacity is not None for channel in machine.destinations)
+        outputs = []
+
+        while True:
+            machine.status = machine.computer.execute(machine.inputs.values, outputs, stop_on_output=bounded)
+
+            for channel in machine.destinations:
+                channel.values.extend(outputs)
+            if outputs:
+                machine.last_output = outputs[-1]
+                outputs.clear()
+
+            if machine.status != OUTPUT or any(channel.full() for channel in machine.destinations):
+                break
+
+    def run(self) -> bool:
+        """
+        Run until no machine can make progress. Returns True if every machine halted, False if some are blocked.
+        """
+
+        progress = True
+        while progress:
+            progress = False
+            for machine in self.machines:
+                if self.runnable(machine):
+                    self.run_machine(machine)
+                    progress = True
+
+        return all(machine.status == HALTED for machine in self.machines)
+
+
+class AmplifierChain(object):
+    """
+    Runs a chain of amplifiers for many phase settings, remembering the output of every stage. A stage's output
+    only depends on its phase and input, so phase settings sharing a prefix only run that prefix once, and a
+    sweep over all permutations of n phases runs each distinct prefix once instead of n! * n stages.
+    """
 
-    amplifiers: List[IntcodeComputer] = [IntcodeComputer(program) for name in 'ABCDE']
+    def __init__(self, program: List[int]) -> None:
+        # The amplifiers run one after the other, so a single computer, reset by each run, can be all of them
+        self.amplifier = IntcodeComputer(program)
+        self.stage_outputs: Dict[Tuple[int, int], int] = {}
 
-    for phase, amp in zip(phases, amplifiers):
-        output = amp.run(phase, input_value)[0]
-        input_value = output
+    def run(self, input_value: int, phases: List[int]) -> int:
 
-    return output
+        for phase in phases:
+            output = self.stage_outputs.get((phase, input_value))
+
+            if output is None:
+                output = self.amplifier.run(phase, input_value)[0]
+                self.stage_outputs[(phase, input_value)] = output
+
+            input_value = output
+
+        return input_value
+
+
+def run_amplifiers(program: List[int], input_value: int, phases: List[int]) -> int:
+    return AmplifierChain(program).run(input_value, phases)
 
 
 def run_amplifiers_with_feedback(program: List[int], input_value: int, phases: List[int]) -> int:
 
-    amplifiers: List[IntcodeComputer] = [IntcodeComputer(program) for name in 'ABCDE']
-    program_state: List[int] = [-1 for name in 'ABCDE']  # -1 for not initialized, 0 for executing, 1 for done
+    network = IntcodeNetwork()
+    amplifiers = [network.add_machine(IntcodeComputer(program), [phase]) for phase in phases]
+
+    # Each amplifier feeds the next, and the last one feeds back into the first
+    for amplifier, next_amplifier in zip(amplifiers, amplifiers[1:] + amplifiers[:1]):
+        network.connect(amplifier, next_amplifier)
+
+    amplifiers[0].inputs.values.append(input_value)
+    network.run()
+
+    return amplifiers[-1].last_output
+
 
-    while program_state[-1] <= 0:
-        for i, amp in enumerate(amplifiers):
-            if program_state[i] < 0:
-                output = amp.run_and_halt(phases[i], input_value)
-                program_state[i] = 0
-            elif program_state[i] == 0:
-                output = amp.run_and_halt(input_value)
-            else:
-                continue
-                
-            if output is not None:
-                input_value = output
-            else:
-                program_state[i] = 1
+def amplifier_chain_output(chain: AmplifierChain, phases: List[int]) -> int:
+    return chain.run(0, phases)
 
-    return input_value
+
+def amplifier_output_with_feedback(program: List[int], phases: List[int]) -> int:
+    return run_amplifiers_with_feedback(program, 0, phases)
 
 
 if __name__ == '__main__':
@@ -48,31 +154,49 @@ if __name__ == '__main__':
     assert run_amplifiers(test_program, 0, [1, 0, 4, 3, 2]) == 65210
 
 
+    # Stages are only run for distinct prefixes: 5 + 20 + 60 + 120 + 120 of them for all permutations of 5 phases
+    chain = AmplifierChain(test_program)
+    for phases in permutations(range(5)):
+        expected_output = 0
+        for phase in phases:
+            expected_output = IntcodeComputer(test_program).run(phase, expected_output)[0]
+        assert chain.run(0, phases) == expected_output
+    assert len(chain.stage_outputs) <= 325
+
     test_program = [3,26,1001,26,-4,26,3,27,1002,27,2,27,1,27,26,27,4,27,1001,28,-1,28,1005,28,6,99,0,0,5]
     assert run_amplifiers_with_feedback(test_program, 0, [9,8,7,6,5]) == 139629729
 
     test_program = [3,52,1001,52,-5,52,3,53,1,52,56,54,1007,54,5,55,1005,55,26,1001,54,-5,54,1105,1,12,1,53,54,53,1008,54,0,55,1001,55,1,55,2,53,55,53,4,53,1001,56,-1,56,1005,56,6,99,0,0,0,0,10]
     assert run_amplifiers_with_feedback(test_program, 0, [9,7,8,5,6]) == 18216
 
+    # One machine doubles its input and sends it to two more doublers, which both feed a machine adding its inputs
+    doubler = [3,9,1002,9,2,9,4,9,99,0]
+    adder = [3,11,3,12,1,11,12,13,4,13,99,0,0,0]
+    for capacity in [None, 1]:
+        network = IntcodeNetwork()
+        source = network.add_machine(IntcodeComputer(doubler), [5])
+        left = network.add_machine(IntcodeComputer(doubler), capacity=capacity)
+        right = network.add_machine(IntcodeComputer(doubler), capacity=capacity)
+        sink = network.add_machine(IntcodeComputer(adder), capacity=capacity)
+        network.connect(source, left)
+        network.connect(source, right)
+        network.connect(left, sink)
+        network.connect(right, sink)
+        assert network.run()
+        assert sink.last_output == 40
+
     amplifier_program = read_program('./inputs/day07.txt')
     
-    results = []
-    for phases in permutations(range(5)):
-
-        amp_output = run_amplifiers(amplifier_program, 0, phases)
-
-        results.append((phases, amp_output))
+    # Each worker keeps one chain, so prefixes are shared between all the permutations it runs
+    results = parallel_sweep(
+        amplifier_chain_output, amplifier_program, permutations(range(5)), prepare=AmplifierChain
+    )
 
     max_output_phases = max(results, key=lambda x: x[1])
 
     print(f'Max output: {str(max_output_phases[1])} from phases {str(max_output_phases[0])}')
 
-    results = []
-    for phases in permutations(range(5, 10)):
-
-        amp_output = run_amplifiers_with_feedback(amplifier_program, 0, phases)
-
-        results.append((phases, amp_output))
+    results = parallel_sweep(amplifier_output_with_feedback, amplifier_program, permutations(range(5, 10)))
 
     max_output_phases = max(results, key=lambda x: x[1])
 
@@ -1,4 +1,4 @@
-from day05 import IntcodeComputer, read_program
+from day05 import IntcodeComputer, CompiledIntcodeComputer, read_program
 
 if __name__ == "__main__":
     test_program = [109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99]
@@ -35,13 +35,13 @@ if __name__ == "__main__":
     assert output == test_program[1]
 
     program = read_program('./inputs/day09.txt')
-    computer = IntcodeComputer(program)
+    computer = CompiledIntcodeComputer(program)
     output = computer.run(1)
     assert len(output) == 1
 
     print(f"BOOST keycode: {output[0]}")
 
-    computer = IntcodeComputer(program)
+    computer = CompiledIntcodeComputer(program)
     output = computer.run(2)
     assert len(output) == 1
 
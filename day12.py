@@ -1,6 +1,13 @@
-from typing import List, Tuple
+from typing import List, Tuple, Optional
 from time import time
 from math import gcd
+from concurrent.futures import ProcessPoolExecutor
+
+# Only MoonSystem needs numpy, everything else works without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Moon(object):
@@ -79,6 +86,63 @@ def simulate_motion(moons: List[Moon], time_steps: int) -> None:
     return None
 
 
+class MoonSystem(object):
+    """
+    Moons stored as a struct of arrays, positions and velocities each an (n_moons, 3) numpy array, so a time step
+    is a few whole array operations however many moons there are.
+    """
+
+    def __init__(self, moons: List[Moon]) -> None:
+        if np is None:
+            raise ImportError('MoonSystem needs numpy')
+
+        self.positions = np.array([(moon.x, moon.y, moon.z) for moon in moons], dtype=np.int64)
+        self.velocities = np.array([(moon.v_x, moon.v_y, moon.v_z) for moon in moons], dtype=np.int64)
+
+    def simulate_motion(self, time_steps: int) -> None:
+        positions = self.positions
+        velocities = self.velocities
+
+        for _ in range(time_steps):
+            # Entry [a, b] is the direction from moon a to moon b, which is the pull of b on a
+            velocities += np.sign(positions[None, :, :] - positions[:, None, :]).sum(axis=1)
+            positions += velocities
+
+    def energy(self) -> int:
+        return int((np.abs(self.positions).sum(axis=1) * np.abs(self.velocities).sum(axis=1)).sum())
+
+    def moons(self) -> List['MoonView']:
+        return [MoonView(self, i) for i in range(len(self.positions))]
+
+
+def array_coordinate(array_name: str, axis: int) -> property:
+
+    def get(self: 'MoonView') -> int:
+        return int(getattr(self.system, array_name)[self.index, axis])
+
+    def set(self: 'MoonView', value: int) -> None:
+        getattr(self.system, array_name)[self.index, axis] = value
+
+    return property(get, set)
+
+
+class MoonView(Moon):
+    """
+    One moon of a MoonSystem, read and written through the same attributes as a Moon.
+    """
+
+    x = array_coordinate('positions', 0)
+    y = array_coordinate('positions', 1)
+    z = array_coordinate('positions', 2)
+    v_x = array_coordinate('velocities', 0)
+    v_y = array_coordinate('velocities', 1)
+    v_z = array_coordinate('velocities', 2)
+
+    def __init__(self, system: MoonSystem, index: int) -> None:
+        self.system = system
+        self.index = index
+
+
 def get_state_on_dim(moons: List[Moon], dim: str) -> List[int]:
 
     dim_state = []
@@ -93,48 +157,52 @@ def lcm(val1: int, val2: int) -> int:
     return int(abs(val1 * val2) / gcd(val1, val2))
 
 
-def find_steps_to_repeat(moons: List[Moon]) -> int:
-
-    t = 0
+def axis_period(state: Tuple[int, ...]) -> int:
+    """
+    Steps until the moons return to `state` on one axis, given as from get_state_on_dim. Each step can be run
+    backwards, so the first state to repeat is always the initial one and it's the only one to keep.
+    """
 
-    # A dictionary storing states for each moon and the times when the moon was in that state
-    seen_states = {dim: {get_state_on_dim(moons, dim): [t]} for dim in 'xyz'}
-    any_repeats = {dim: False for dim in 'xyz'}
+    positions = list(state[0::2])
+    velocities = list(state[1::2])
+    initial_positions = positions[:]
+    initial_velocities = velocities[:]
+    n_moons = len(positions)
 
+    t = 0
     while True:
-        simulate_motion(moons, 1)
-        
+        for i in range(n_moons - 1):
+            for j in range(i + 1, n_moons):
+                if positions[i] < positions[j]:
+                    velocities[i] += 1
+                    velocities[j] -= 1
+                elif positions[i] > positions[j]:
+                    velocities[i] -= 1
+                    velocities[j] += 1
+
+        for i in range(n_moons):
+            positions[i] += velocities[i]
+
         t += 1
+        if velocities == initial_velocities and positions == initial_positions:
+            return t
 
-        for dim in 'xyz':
-            if any_repeats[dim]:
-                continue
-            
-            state_on_dim = get_state_on_dim(moons, dim)
-
-            if state_on_dim in seen_states[dim]:
-                seen_states[dim][state_on_dim].append(t)
-                any_repeats[dim] = True
-            else:
-                seen_states[dim][state_on_dim] = [t]
-
-        if all(any_repeats[k] for k in any_repeats):
-            break
-
-    repeat_periods = []
-    for dim in 'xyz':
-        for state in seen_states[dim]:
-            if len(seen_states[dim][state]) > 1:
-                repeat_periods.append(
-                    seen_states[dim][state][1] - seen_states[dim][state][0]
-                )
-    
-    repeat_period = lcm(
-        repeat_periods[0], 
-        lcm(repeat_periods[1], repeat_periods[2])
-    )
 
-    return repeat_period
+def find_steps_to_repeat(moons: List[Moon], max_workers: Optional[int]=None) -> int:
+    """
+    The axes don't affect each other, so each one is run to its own period in a separate worker process and the
+    whole system repeats after the lcm of those. max_workers=1 runs the axes one after another in this process.
+    """
+
+    states = [get_state_on_dim(moons, dim) for dim in 'xyz']
+
+    if max_workers == 1:
+        repeat_periods = [axis_period(state) for state in states]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or len(states)) as executor:
+            repeat_periods = list(executor.map(axis_period, states))
+
+    return lcm(repeat_periods[0], lcm(repeat_periods[1], repeat_periods[2]))
 
 
 if __name__ == '__main__':
@@ -176,10 +244,25 @@ if __name__ == '__main__':
     total_energy = sum(moon.energy() for moon in test_moons)
     assert total_energy == 1940
 
+    # The array simulator agrees with simulate_motion, and its moons work like Moons
+    if np is not None:
+        test_moons = parse_positions(test_positions)
+        test_system = MoonSystem(parse_positions(test_positions))
+        simulate_motion(test_moons, 100)
+        test_system.simulate_motion(100)
+        assert [moon.vector() for moon in test_system.moons()] == [moon.vector() for moon in test_moons]
+        assert sum(moon.energy() for moon in test_system.moons()) == test_system.energy() == 1940
+
+        test_view = test_system.moons()[2]
+        test_view.v_y += 5
+        assert test_system.velocities[2, 1] == test_moons[2].v_y + 5
+
     # Test
     test_moons = parse_positions(test_positions)
     test_period = find_steps_to_repeat(test_moons)
     assert test_period == 4686774924
+    assert find_steps_to_repeat(test_moons, max_workers=1) == test_period
+    assert axis_period(get_state_on_dim(test_moons, 'x')) == 2028
 
     # Part 1
     moons = read_positions('./inputs/day12.txt')
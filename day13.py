@@ -1,5 +1,5 @@
 from typing import List, Tuple, Any
-from day05 import IntcodeComputer, read_program
+from day05 import CompiledIntcodeComputer, read_program
 import curses
 import time
 import sys
@@ -25,7 +25,7 @@ class ArcadeCabinet(object):
         self.score: int = 0
         self.paddle_x_position = -1
         self.ball_x_position = -1
-        self.computer = IntcodeComputer(tmp)
+        self.computer = CompiledIntcodeComputer(tmp)
         self.screen = screen
         initial_screen = self.computer.run_until_input_required()
         self.render_screen(initial_screen)
@@ -97,9 +97,9 @@ def main(screen: Any, bot_player: bool):
 if __name__ == '__main__':
 
     program = read_program('./inputs/day13.txt')
-    computer = IntcodeComputer(program)
-    output = computer.run()
-    print(f"Number of block tiles: {sum([1 for i in range(2, len(output), 3) if output[i] == 2])}")
+    # Count blocks as the tiles are drawn, three outputs at a time
+    tiles = CompiledIntcodeComputer(program).stream()
+    print(f"Number of block tiles: {sum(1 for x, y, tile in zip(tiles, tiles, tiles) if tile == 2)}")
 
     if len(sys.argv) > 1:
         bot_player = int(sys.argv[1]) == 1
@@ -1,11 +1,12 @@
 from typing import List, Dict, Tuple, Any
-from day05 import IntcodeComputer, read_program
-from collections import defaultdict
+from day05 import IntcodeComputer, PagedMemory, read_program
+from collections import defaultdict, deque
 import sys
 import curses
 import random
 import time
 import json
+import os
 
 # You need to find a thing, but only have a robot that you send movement commands to 
 # (one step in direction N, S, E, W) and it sends back a status indicating what happened 
@@ -142,6 +143,38 @@ def is_exploration_complete(maze_map: Dict[Tuple[int, int], str]) -> bool:
     return True
 
 
+def map_maze(program: List[int]) -> Dict[Tuple[int, int], str]:
+    '''
+    Map the whole maze without rendering, with a breadth first search that forks the robot at every open location
+    instead of walking it back and forth.
+    '''
+
+    maze_map: Dict[Tuple[int, int], str] = defaultdict(lambda: UNKNOWN)
+    maze_map[(0, 0)] = START
+
+    # Paged memory makes every fork share the robot's memory until it's written to
+    frontier = deque([((0, 0), IntcodeComputer(program, PagedMemory))])
+
+    while frontier:
+        current_location, robot = frontier.popleft()
+
+        for direction_to_move in [NORTH, SOUTH, WEST, EAST]:
+            destination = destination_coordinate(current_location, direction_to_move)
+            if maze_map[destination] != UNKNOWN:
+                continue
+
+            moved_robot = robot.fork()
+            status = moved_robot.run_until_input_required(direction_to_move)[0]
+
+            if status == HIT_WALL:
+                maze_map[destination] = WALL
+            else:
+                maze_map[destination] = GOAL if status == FOUND_GOAL else PATH
+                frontier.append((destination, moved_robot))
+
+    return maze_map
+
+
 def main_rendered(screen: Any, program: List[int]) -> None:
     '''
     Navigate through the maze to find the end and display progress on screen.
@@ -218,6 +251,11 @@ if __name__ == '__main__':
     test_history = {(1, 0): 1, (-1, 0): 1, (0, 1): 1, (0, -1): 4}
     assert get_next_direction((0, 0), test_history) != SOUTH
 
+    if os.path.exists('day15_maze_map.json'):
+        explored_map = deserialize_maze('day15_maze_map.json')
+        searched_map = map_maze(read_program('./inputs/day15.txt'))
+        assert all(searched_map[k] == explored_map[k] for k in explored_map if explored_map[k] != UNKNOWN)
+
     # display_solution = False
     # if len(sys.argv) > 1:
     #     if sys.argv[1] == '1':
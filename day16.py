@@ -1,4 +1,6 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from array import array
+from itertools import accumulate
 import math
 
 
@@ -31,10 +33,21 @@ def apply_pattern(base_pattern: List[int], phase_input_signal: List[int], positi
 
 
 def ones_digit(value: int) -> int:
-    return int(str(value)[-1])
+    return abs(value) % 10
 
 
-def FFT(signal: List[int], n_phases: int, verbose: bool=False) -> List[int]:
+def FFT(signal: List[int], n_phases: int, verbose: bool=False, backend: str='python') -> List[int]:
+    """
+    Run `n_phases` phases of the FFT. The backend is 'python' (applying the pattern digit by digit), 'prefix_sum'
+    (see prefix_sum_FFT) or 'numpy' (see numpy_FFT), all giving the same result.
+    """
+
+    if backend == 'prefix_sum':
+        return prefix_sum_FFT(signal, n_phases, verbose)
+    elif backend == 'numpy':
+        return numpy_FFT([signal], n_phases, verbose)[0].tolist()
+    elif backend != 'python':
+        raise ValueError(f'Unknown FFT backend {backend}')
 
     base_pattern = [0, 1, 0, -1]
 
@@ -57,6 +70,126 @@ def FFT(signal: List[int], n_phases: int, verbose: bool=False) -> List[int]:
     return output_signal
 
 
+def prefix_sum_phase(signal: List[int]) -> List[int]:
+    """
+    One FFT phase from prefix sums of the signal. The pattern for output position i is runs of i + 1 ones and
+    minus ones, the first run of ones starting at position i, so each run adds or subtracts a difference of two
+    prefix sums. There are about n / (2 * (i + 1)) runs for position i, so O(n log n) for the phase.
+    """
+
+    n = len(signal)
+    prefix_sums = list(accumulate(signal, initial=0))
+
+    output_signal = []
+    for i in range(n):
+        run_length = i + 1
+        total = 0
+
+        for start in range(i, n, 4 * run_length):
+            total += prefix_sums[min(start + run_length, n)] - prefix_sums[start]
+
+            negative_start = start + 2 * run_length
+            if negative_start < n:
+                total -= prefix_sums[min(negative_start + run_length, n)] - prefix_sums[negative_start]
+
+        output_signal.append(abs(total) % 10)
+
+    return output_signal
+
+
+def prefix_sum_FFT(signal: List[int], n_phases: int, verbose: bool=False) -> List[int]:
+    """
+    Same result as FFT, with each phase computed by prefix_sum_phase.
+    """
+
+    output_signal = signal.copy()
+
+    for phase in range(n_phases):
+        output_signal = prefix_sum_phase(output_signal)
+
+        if verbose and (phase + 1) % 10 == 0:
+            print(f'Phase {phase + 1}')
+
+    return output_signal
+
+
+def numpy_FFT(signals: List[List[int]], n_phases: int, verbose: bool=False) -> Any:
+    """
+    FFT of several signals of the same length at once, returned as the rows of an int8 numpy array. The runs of
+    ones and minus ones (see prefix_sum_phase) are the same for every signal and phase, so they're listed once,
+    grouped by output position, and a phase is a cumulative sum of each signal, one gather of the prefix sum
+    differences over the runs, and a sum of the runs of each position.
+    """
+
+    # Only this backend needs numpy, so it's only imported when it's used
+    import numpy as np
+
+    digits = np.atleast_2d(np.array(signals, dtype=np.int8))
+    n_signals, n = digits.shape
+
+    starts, ends, signs, position_offsets = [], [], [], []
+    n_runs = 0
+    for i in range(n):
+        run_length = i + 1
+        positive_starts = np.arange(i, n, 4 * run_length)
+        negative_starts = positive_starts + 2 * run_length
+        negative_starts = negative_starts[negative_starts < n]
+
+        position_offsets.append(n_runs)
+        for run_starts, sign in [(positive_starts, 1), (negative_starts, -1)]:
+            starts.append(run_starts)
+            ends.append(np.minimum(run_starts + run_length, n))
+            signs.append(np.full(len(run_starts), sign, dtype=np.int32))
+            n_runs += len(run_starts)
+
+    starts = np.concatenate(starts)
+    ends = np.concatenate(ends)
+    signs = np.concatenate(signs)
+
+    # Digit sums of signals up to 200 million digits long fit in 32 bits
+    prefix_sums = np.zeros((n_signals, n + 1), dtype=np.int32)
+
+    for phase in range(n_phases):
+        np.cumsum(digits, axis=1, dtype=np.int32, out=prefix_sums[:, 1:])
+        runs = (prefix_sums[:, ends] - prefix_sums[:, starts]) * signs
+        totals = np.add.reduceat(runs, position_offsets, axis=1)
+        digits = (np.abs(totals) % 10).astype(np.int8)
+
+        if verbose and (phase + 1) % 10 == 0:
+            print(f'Phase {phase + 1}')
+
+    return digits
+
+
+def decode_message(
+    signal: List[int], repeats: int=10000, offset: Optional[int]=None, n_phases: int=100, message_length: int=8
+) -> List[int]:
+    """
+    Run the FFT over the signal repeated `repeats` times and return the `message_length` digits at `offset`, by
+    default the number given by the first seven digits of the signal.
+
+    From the midpoint of the signal on, the pattern for position i is 0 before i and 1 from i to the end, so each
+    output digit is the sum of the input digits from its position to the end. Only the digits from the offset on
+    are needed then, and a phase is one cumulative sum over them, run back to front. Offsets before the midpoint
+    need the whole signal and go through prefix_sum_FFT.
+    """
+
+    if offset is None:
+        offset = int(''.join(str(v) for v in signal[:7]))
+
+    length = len(signal) * repeats
+    if 2 * offset + 1 < length:
+        return prefix_sum_FFT(signal * repeats, n_phases)[offset:offset + message_length]
+
+    # The digits from the offset to the end, last one first
+    reversed_tail = array('b', (signal[i % len(signal)] for i in range(length - 1, offset - 1, -1)))
+
+    for phase in range(n_phases):
+        reversed_tail = array('b', [total % 10 for total in accumulate(reversed_tail)])
+
+    return list(reversed_tail[:-message_length - 1:-1])
+
+
 def lists_equal(list1: List[Any], list2: List[Any]) -> bool:
     if len(list1) != len(list2):
         return False
@@ -78,7 +211,38 @@ if __name__ == '__main__':
     test_result = FFT(test_signal, 100)
     assert lists_equal(test_result[:8], test_answer)
 
+    # The prefix sum engine matches FFT digit for digit, whatever the length
     signal = read_signal('./inputs/day16.txt')
-    result = FFT(signal, 100, True)
+    for test_signal in ['12345678', '80871224585914546619083218645595', '9' * 37, '0123456789' * 13]:
+        test_signal = parse_signal(test_signal)
+        for n_phases in [1, 4]:
+            assert lists_equal(prefix_sum_FFT(test_signal, n_phases), FFT(test_signal, n_phases))
+    assert lists_equal(prefix_sum_FFT(signal, 2), FFT(signal, 2))
+
+    # The numpy backend, when numpy is installed, on one signal and on a batch of them
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    if numpy is not None:
+        test_signals = [parse_signal('80871224585914546619083218645595'), parse_signal('0123456789' * 3 + '01')]
+        assert lists_equal(FFT(test_signals[0], 100, backend='numpy'), FFT(test_signals[0], 100))
+        test_results = numpy_FFT(test_signals, 4)
+        for test_signal, test_result in zip(test_signals, test_results):
+            assert lists_equal(test_result.tolist(), FFT(test_signal, 4))
+        assert lists_equal(FFT(signal, 2, backend='numpy'), FFT(signal, 2))
+
+    # Part 2 examples, and an offset before the midpoint matching the first eight digits of the plain FFT
+    assert lists_equal(decode_message(parse_signal('03036732577212944063491565474664')), parse_signal('84462026'))
+    assert lists_equal(decode_message(parse_signal('02935109699940807407585447034323')), parse_signal('78725270'))
+    assert lists_equal(decode_message(parse_signal('03081770884921959731165446850517')), parse_signal('53553731'))
+    test_signal = parse_signal('80871224585914546619083218645595')
+    assert lists_equal(decode_message(test_signal, 1, 0), FFT(test_signal, 100)[:8])
+
+    result = FFT(signal, 100, True, backend='prefix_sum')
 
     print(f'Result: {"".join([str(v) for v in result[:8]])}')
+
+    message = decode_message(signal)
+    print(f'Message: {"".join([str(v) for v in message])}')